@@ -1,10 +1,10 @@
 from fastmcp import FastMCP, Context
 import uvicorn.config
-from schedule import Schedule, People, noone, Event, Events
+from schedule import AsyncSchedule, People, noone, Event, Events
 import os
 from pathlib import Path
 import dotenv
-from datetime import date, time
+from datetime import date, time, timedelta
 import logging
 import traceback
 
@@ -65,7 +65,7 @@ class ScheduleBot:
         # self.people = self._load_people()
         self.me = noone
         self.me_id = None
-        self.schedule = Schedule(self.email, self.password)
+        self.schedule = AsyncSchedule(self.email, self.password)  # logs in lazily, on the first tool call
         self.results = People()  # For name search results
         self.who_goes_results = People()  # For who_goes pagination
         self.last_schedule = Events()  # For schedule pagination
@@ -87,8 +87,10 @@ class ScheduleBot:
         mcp.tool()(self.get_schedule_page)
         mcp.tool()(self.debug)  # uncomment for debug tool
         mcp.tool()(self.search_event)
+        mcp.tool()(self.find_free_slots)
+        mcp.tool()(self.find_overlap)
     
-    def check_auth(self, ctx: Context) -> str:
+    async def check_auth(self, ctx: Context) -> str:
         """Check if the user's name is set in the schedule client. Must be called in new chat contexts prior to any other schedule tool. If the user is authorized, read user's name and info in the language you are talking."""
         req = ctx.get_http_request()
         head = req.headers
@@ -104,7 +106,7 @@ class ScheduleBot:
                 self.schedule.set_me_id(self.me_id)
                 return create_success_response("User authorized successfully by ID.")
             else:
-                people = self.schedule.search_person(username, by_id=False)
+                people = await self.schedule.search_person(username, by_id=False)
                 if not people:
                     return create_error_response("User not found.", "auth_failed")
                 self.me = people[0]
@@ -114,12 +116,12 @@ class ScheduleBot:
         except Exception as e:
             return format_error_message(e)
     
-    def search_name(self, name: str) -> str:
+    async def search_name(self, name: str) -> str:
         """Search the user's name in the schedule api. This tool is called if the user is not autherized or gets the schedule of a friend."""
         if not name:
             return create_error_response("Name is empty", "empty_name")
         try:
-            self.results = self.schedule.search_person(name, by_id=False)
+            self.results = await self.schedule.search_person(name, by_id=False)
             if not self.results:
                 return create_error_response("No results found. Prompt the user for his name again.", "no_results")
             return create_success_response("Found people", {"people": self.results.json()})
@@ -143,7 +145,7 @@ class ScheduleBot:
         except Exception as e:
             return format_error_message(e)
     
-    def get_schedule(self, start_date: str, end_date: str) -> str:
+    async def get_schedule(self, start_date: str, end_date: str) -> str:
         """Get the schedule for the current user between dates (ISO format). Returns the schedule in JSON. Not used to get friends' schedules."""
         try:
             if not self.me_id:
@@ -152,7 +154,7 @@ class ScheduleBot:
                 return create_error_response("Start date or end date is empty", "empty_date")
             start_date = date.fromisoformat(start_date)
             end_date = date.fromisoformat(end_date)
-            self.last_schedule = self.schedule(self.me_id, start_date, end_date)
+            self.last_schedule = await self.schedule(self.me_id, start_date, end_date)
             if len(self.last_schedule) == 0:
                 return create_success_response("There are no events in the specified range", {"events": []})
             if len(self.last_schedule) > 30:
@@ -187,38 +189,38 @@ class ScheduleBot:
         except Exception as e:
             return format_error_message(e)
 
-    def what_is_now(self) -> str:
+    async def what_is_now(self) -> str:
         """Get the current event or status for the user."""
         if not self.me_id:
             return create_error_response("User not authenticated. Call check_auth or set_person first.", "auth_required")
         try:
-            schedule_data = self.schedule.now(self.me_id)
-            if self.schedule.on_break(self.me_id):
+            schedule_data = await self.schedule.now(self.me_id)
+            if await self.schedule.on_break(self.me_id):
                 return create_success_response("The user is on break")
-            elif self.schedule.on_non_working_time(self.me_id):
+            elif await self.schedule.on_non_working_time(self.me_id):
                 return create_success_response("The user is not studying now")
             return create_success_response("Current event retrieved", {"event": schedule_data.json()})
         except Exception as e:
             return format_error_message(e)
 
-    def get_next(self) -> str:
+    async def get_next(self) -> str:
         """Get the next event for the current user."""
         if not self.me_id:
             return create_error_response("User not authenticated. Call check_auth or set_person first.", "auth_required")
         try:
-            schedule_data = self.schedule.next(self.me_id)
+            schedule_data = await self.schedule.next(self.me_id)
             if not schedule_data:
                 return create_success_response("No next event found")
             return create_success_response("Next event retrieved", {"event": schedule_data.json()})
         except Exception as e:
             return format_error_message(e)
 
-    def who_goes(self, event_id: str) -> str:
+    async def who_goes(self, event_id: str) -> str:
         """Fetch list of people attending an event and store for pagination."""
         try:
             fe = Event(event_id, 0, date.today(), time(0, 0), time(0, 0), 
                 "none", "none", "none", "none", "none", "none")
-            self.who_goes_results = self.schedule.who_goes(fe)
+            self.who_goes_results = await self.schedule.who_goes(fe)
             if not self.who_goes_results:
                 return create_success_response("No one is going to this event", {"people": []})
             return self.get_who_goes_page(0)  # Return first page by default
@@ -261,13 +263,15 @@ class ScheduleBot:
                 "current_working_directory": os.getcwd(),
                 "people_path": str(self.people_path),
                 "me": self.me.json(),
+                "search_cache": self.schedule.client.search_cache.stats,
+                "who_goes_cache": self.schedule.client.who_goes_cache.stats,
             }
             return create_success_response("Debug information retrieved", data)
         except Exception as e:
             return format_error_message(e)
 
     def search_event(self, query: str) -> str:
-        """Search for an event in the schedule."""
+        """Search for an event in the last schedule. All the words must be found, a beginning of a word is enough. Prefix a word with a field to look only there: name:, teacher:, room:, address:, status:, format:, time:, e.g. "teacher:иванов room:12"."""
         try:
             if not query:
                 return create_error_response("Query is empty", "empty_query")
@@ -278,6 +282,36 @@ class ScheduleBot:
         except Exception as e:
             return format_error_message(e)
 
+    async def find_free_slots(self, person_ids: list[str], start_date: str, end_date: str, min_minutes: int = 90, grid: str = "bells") -> str:
+        """Find times when all the given people (ids from search_name) are free between dates (ISO format), e.g. for a consultation of a group. grid is "bells" for slots starting at the bells of the pairs, or "minutes" for whole free windows."""
+        try:
+            if not person_ids:
+                return create_error_response("No people given", "empty_people")
+            if not start_date or not end_date:
+                return create_error_response("Start date or end date is empty", "empty_date")
+            slots = await self.schedule.free_slots(person_ids, date.fromisoformat(start_date), date.fromisoformat(end_date), timedelta(minutes=min_minutes), grid)
+            if not slots:
+                return create_success_response("There is no common free time in the specified range", {"slots": []})
+            data = [{"start": slot.start.isoformat(), "end": slot.end.isoformat(), "pair": slot.event_num, "text": str(slot)} for slot in slots]
+            return create_success_response("Free slots found", {"slots": data})
+        except Exception as e:
+            return format_error_message(e)
+
+    async def find_overlap(self, person_ids: list[str], start_date: str, end_date: str) -> str:
+        """Find times when all the given people (ids from search_name, two or more) are busy at the same time between dates (ISO format), e.g. common classes with a friend. common is true when everybody is on the same class."""
+        try:
+            if len(person_ids) < 2:
+                return create_error_response("At least two people are needed", "empty_people")
+            if not start_date or not end_date:
+                return create_error_response("Start date or end date is empty", "empty_date")
+            found = await self.schedule.overlap(person_ids, date.fromisoformat(start_date), date.fromisoformat(end_date))
+            if not found:
+                return create_success_response("There is no overlap in the specified range", {"overlaps": []})
+            data = [{"start": overlap.start.isoformat(), "end": overlap.end.isoformat(), "common": overlap.common, "event_ids": [event.event_id for event in overlap.events], "text": str(overlap)} for overlap in found]
+            return create_success_response("Overlaps found", {"overlaps": data})
+        except Exception as e:
+            return format_error_message(e)
+
 # Create and run the bot
 # name is not main, the server imports this file.
 bot = ScheduleBot()
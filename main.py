@@ -121,6 +121,16 @@ while True:
             case "next" | "следующий" | "следующая" | "следующее" | "дальше" | "далее":  # this has record amount of synonyms!
                 evt = schedule.next(me_id)
                 print(evt if evt is not None else "Следующей пары нет")
+            case "overlap" | "пересечение":
+                friends = [person for person in people if person.person_id != me_id]
+                friend = ask_choice_from_list(friends, "Выберите друга: ")
+                if friend is None:
+                    print("Друзей пока нет")
+                    continue
+                # this week like the week command, the same classes and the ones at the same time
+                days = 6 - date.today().weekday()
+                found = schedule.overlap([me_id, friend.person_id], start_time=date.today(), end_time=date.today() + timedelta(days=days))
+                print("\n".join(map(str, found)) if found else "На этой неделе пересечений нет")
             case "who goes" | "кто идёт":
                 # get events that are last fetched and ask for the event
                 s = schedule.last_events
@@ -139,7 +149,7 @@ while True:
                     print("На эту пару никто не идёт")  # impossible to reach. At least I and teacher go!
             case "file" | "файл":
                 with Path("schedule.txt").open("w", encoding="UTF-8") as f:
-                    f.write(str(schedule.last_events))  # get what was last printed
+                    schedule.last_events.write(f)  # what was last printed, line by line
                 print("Расписание сохранено в файле schedule.txt")
             case "help" | "помощь":
                 with Path("command_help.md").open("r", encoding="UTF-8") as f:
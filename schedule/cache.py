@@ -0,0 +1,158 @@
+# In-memory memoization with time to live and a size bound. Not to be confused with the json cache in the cache folder.
+
+import time
+import inspect
+import threading
+from functools import wraps
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    A dict-like cache where every entry lives for ttl seconds, and the least recently used entry is evicted when there are more than maxsize.
+    It is thread-safe and counts hits, misses and evictions.
+    """
+    def __init__(self, ttl: float=60, maxsize: int=128):
+        """
+        Parameters:
+        ttl (float): how long an entry lives, in seconds.
+        maxsize (int): maximal number of entries.
+        """
+        self.ttl=ttl
+        self.maxsize=maxsize
+        self.hits=0
+        self.misses=0
+        self.evictions=0  # evicted because the cache was full
+        self.expirations=0  # dropped because they were too old
+        self._data=OrderedDict()  # key -> (expiry time, value), the least recently used first
+        self._lock=threading.RLock()
+
+    def get(self, key, default=None):
+        """Returns the value if it is there and alive, else default."""
+        with self._lock:
+            entry=self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                expire, value=entry
+                if time.monotonic()<expire:
+                    self._data.move_to_end(key)
+                    self.hits+=1
+                    return value
+                del self._data[key]
+                self.expirations+=1
+            self.misses+=1
+            return default
+
+    def set(self, key, value, ttl: float|None=None):
+        """Stores the value. ttl overrides the default time to live for this entry."""
+        with self._lock:
+            self._data[key]=(time.monotonic()+(self.ttl if ttl is None else ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data)>self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions+=1
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry=self._data.pop(key, _MISSING)
+            return default if entry is _MISSING else entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key) -> bool:
+        with self._lock:
+            entry=self._data.get(key, _MISSING)
+            return entry is not _MISSING and time.monotonic()<entry[0]
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    @property
+    def stats(self) -> dict:
+        """Counters of the cache, e.g. for the debug tool."""
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "expirations": self.expirations, "size": len(self._data), "maxsize": self.maxsize}
+
+
+def _make_key(args: tuple, kwargs: dict):
+    return (args, tuple(sorted(kwargs.items()))) if kwargs else args
+
+
+def _identity(value):
+    return value
+
+
+def ttl_cache(ttl: float=60, maxsize: int=128, copy=None):
+    """
+    Decorator that memoizes a function or a coroutine function in a TTLCache. Arguments must be hashable. Exceptions are not cached.
+    The cache is available as func.cache, e.g. func.cache.stats or func.cache.clear().
+
+    Parameters:
+    ttl (float): how long a result lives, in seconds.
+    maxsize (int): how many results are kept.
+    copy (function): makes every result that is given out a copy, e.g. copy.deepcopy for dicts and lists, so a caller that changes its result doesn't change it for the others.
+    """
+    give=copy or _identity
+    def decorator(func):
+        cache=TTLCache(ttl, maxsize)
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                key=_make_key(args, kwargs)
+                result=cache.get(key, _MISSING)
+                if result is _MISSING:
+                    result=await func(*args, **kwargs)
+                    cache.set(key, result)
+                return give(result)
+            async_wrapper.cache=cache
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            key=_make_key(args, kwargs)
+            result=cache.get(key, _MISSING)
+            if result is _MISSING:
+                result=func(*args, **kwargs)
+                cache.set(key, result)
+            return give(result)
+        wrapper.cache=cache
+        return wrapper
+    return decorator
+
+
+def cached_method(attr: str, copy=None):
+    """
+    Like ttl_cache, but for methods: the TTLCache is the attribute attr of the instance, and self is not a part of the key.
+    Every instance has its own cache then, and a cache doesn't keep dead instances alive, like a cache of the class with self in the keys does.
+
+    Parameters:
+    attr (str): name of the TTLCache attribute, set in __init__.
+    copy (function): see ttl_cache.
+    """
+    give=copy or _identity
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(self, *args, **kwargs):
+                cache=getattr(self, attr)
+                key=_make_key(args, kwargs)
+                result=cache.get(key, _MISSING)
+                if result is _MISSING:
+                    result=await func(self, *args, **kwargs)
+                    cache.set(key, result)
+                return give(result)
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(self, *args, **kwargs):
+            cache=getattr(self, attr)
+            key=_make_key(args, kwargs)
+            result=cache.get(key, _MISSING)
+            if result is _MISSING:
+                result=func(self, *args, **kwargs)
+                cache.set(key, result)
+            return give(result)
+        return wrapper
+    return decorator
@@ -0,0 +1,7 @@
+# A fake modeus for testing and benchmarks without credentials and network.
+# Run it with python -m schedule.fake and put MODEUS_URL=http://127.0.0.1:8080 into .env.
+
+from .generator import FakeUniversity, generate_big_mess
+from .server import FakeModeusServer, make_token
+
+__all__ = ["FakeUniversity", "generate_big_mess", "FakeModeusServer", "make_token"]
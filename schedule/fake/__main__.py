@@ -0,0 +1,26 @@
+import argparse
+from .generator import FakeUniversity
+from .server import FakeModeusServer
+
+parser=argparse.ArgumentParser(prog="python -m schedule.fake", description="Serves a made up university on the endpoints of modeus.")
+parser.add_argument("--host", default="127.0.0.1")
+parser.add_argument("--port", type=int, default=8080)
+parser.add_argument("--events", type=int, default=2000)
+parser.add_argument("--people", type=int, default=300, help="number of students")
+parser.add_argument("--rooms", type=int, default=40)
+parser.add_argument("--organizers", type=int, default=30, help="number of teachers")
+parser.add_argument("--attendees", type=int, default=20, help="students per event")
+parser.add_argument("--seed", type=int, default=0)
+parser.add_argument("--email", help="the only accepted email, any by default")
+parser.add_argument("--password", help="the only accepted password, any by default")
+parser.add_argument("-v", "--verbose", action="store_true", help="log every request")
+args=parser.parse_args()
+
+university=FakeUniversity(args.events, args.people, args.rooms, args.organizers, args.attendees, seed=args.seed)
+server=FakeModeusServer(university, args.host, args.port, args.email, args.password, verbose=args.verbose)
+print(f"Fake modeus is at {server.url}, set MODEUS_URL={server.url} to use it.")
+print(f"You log in as {university.persons[server.person_id]['fullName']} ({server.person_id})." if server.person_id else "There are no students.")
+try:
+    server.serve_forever()
+except KeyboardInterrupt:
+    server.server_close()
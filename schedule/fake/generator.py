@@ -0,0 +1,199 @@
+# Makes up a university: people, rooms and a semester of events, and answers like modeus does, with the big mess and all its links.
+# It's random, but seeded, so the same arguments give the same university.
+
+import uuid
+import random
+from datetime import date, datetime, timedelta
+from pytz import timezone
+from ..parsers.events import STUDIES
+
+moscow=timezone("Europe/Moscow")
+ADDRESS_PREFIX="обл. Архангельская, г. Архангельск, "  # the parser cuts it off, so it must be there
+
+LAST_NAMES=["Иванов", "Смирнов", "Кузнецов", "Попов", "Соколов", "Лебедев", "Козлов", "Новиков", "Морозов", "Петров", "Волков", "Соловьёв", "Васильев", "Зайцев", "Павлов", "Семёнов", "Голубев", "Виноградов", "Богданов", "Воробьёв"]
+FIRST_NAMES=["Александр", "Дмитрий", "Максим", "Сергей", "Андрей", "Алексей", "Артём", "Илья", "Кирилл", "Михаил", "Пётр", "Фёдор", "Семён", "Никита", "Матвей"]
+MIDDLE_NAMES=["Александрович", "Дмитриевич", "Сергеевич", "Андреевич", "Алексеевич", "Михайлович", "Петрович", "Фёдорович", "Иванович", "Николаевич"]
+SUBJECTS=["Математический анализ", "Линейная алгебра", "Физика", "Программирование", "Базы данных", "Философия", "История России", "Иностранный язык", "Физическая культура", "Дискретная математика", "Теория вероятностей", "Компьютерные сети", "Операционные системы", "Экономика"]
+SPECIALTIES=[("09.03.01 Информатика и вычислительная техника", "Программное обеспечение"), ("01.03.02 Прикладная математика и информатика", "Математическое моделирование"), ("38.03.01 Экономика", "Финансы и кредит"), ("03.03.02 Физика", "Физика конденсированного состояния")]
+DEPARTMENTS=["Кафедра прикладной математики", "Кафедра информатики", "Кафедра физики", "Кафедра иностранных языков", "Кафедра философии"]
+BUILDINGS=["наб. Северной Двины, д. 17", "ул. Урицкого, д. 56", "ул. Смольный Буян, д. 1", "пр. Ломоносова, д. 4"]
+TYPES=[("LECT", "LECT"), ("SEMI", "SEMI"), ("LAB", "LAB"), ("SEMI", "SEMINAR"), ("CONS", None), ("MID_CHECK", None)]
+STATUSES=["Запланировано", "Проведено", "Отменено"]
+LESSON=timedelta(minutes=90)
+
+
+def _href(item_id: str) -> dict:
+    return {"href": f"/{item_id}"}
+
+
+class FakeUniversity:
+    """
+    A made up university that answers like modeus. It keeps the events and the people and builds the big mess for any subset of the events.
+
+    Attributes:
+    - students (list): dicts like students of the persons search.
+    - employees (list): dicts like employees of the persons search.
+    - persons (dict): person id -> dict like persons of the big mess.
+    - rooms (list): dicts like rooms of the big mess.
+    - events (list): the events sorted by start. Every one is a dict with id, start, end, name, teacher, attendees, room and so on.
+    """
+    def __init__(self, events: int=2000, people: int=300, rooms: int=40, organizers: int=30, attendees_per_event: int=20, start: date=date(2025, 9, 1), days: int=120, seed: int=0):
+        """
+        Parameters:
+        - events (int): how many events the university has.
+        - people (int): how many students. They are split into groups, and every event is attended by a group.
+        - rooms (int): how many rooms.
+        - organizers (int): how many teachers.
+        - attendees_per_event (int): size of a group of students.
+        - start (date): the first day of the semester.
+        - days (int): length of the semester. Events are spread over the working days.
+        - seed (int): seed of the random generator.
+        """
+        self.rng=random.Random(seed)
+        self.persons={}
+        self.students=[]
+        self.employees=[]
+        for _ in range(people):
+            self.students.append(self._student(self._person()))
+        for _ in range(organizers):
+            self.employees.append(self._employee(self._person()))
+        self.rooms=[self._room(i) for i in range(rooms)]
+        size=max(1, attendees_per_event)
+        student_ids=[student["personId"] for student in self.students]
+        self.groups=[student_ids[i:i+size] for i in range(0, len(student_ids), size)] or [[]]
+        self.courses=[{"id": self._id(), "name": name, "nameShort": name[:10]} for name in SUBJECTS]
+        self.events=sorted((self._event(start, days) for _ in range(events)), key=lambda event: event["start"])
+        self.by_id={event["id"]: event for event in self.events}
+        self.student_by_id={student["personId"]: student for student in self.students}
+        self.by_person={}  # person id -> events, sorted by start
+        for event in self.events:
+            for person_id in event["attendees"]+[event["teacher"]]:
+                self.by_person.setdefault(person_id, []).append(event)
+
+    def _id(self) -> str:
+        return str(uuid.UUID(int=self.rng.getrandbits(128), version=4))
+
+    def _person(self) -> dict:
+        last, first, middle=self.rng.choice(LAST_NAMES), self.rng.choice(FIRST_NAMES), self.rng.choice(MIDDLE_NAMES)
+        person={"id": self._id(), "lastName": last, "firstName": first, "middleName": middle, "fullName": f"{last} {first} {middle}"}
+        person["_links"]={"self": _href(person["id"])}
+        self.persons[person["id"]]=person
+        return person
+
+    def _student(self, person: dict) -> dict:
+        specialty, profile=self.rng.choice(SPECIALTIES)
+        start=date(self.rng.randint(2021, 2025), 9, 1)
+        return {"personId": person["id"], "flowCode": f"{start.year}", "learningStartDate": start.isoformat(), "learningEndDate": date(start.year+4, 8, 31).isoformat(), "specialtyName": specialty, "specialtyProfile": profile}
+
+    def _employee(self, person: dict) -> dict:
+        return {"personId": person["id"], "groupName": self.rng.choice(DEPARTMENTS), "dateIn": date(self.rng.randint(2000, 2024), 9, 1).isoformat(), "dateOut": None}
+
+    def _room(self, number: int) -> dict:
+        building=self.rng.choice(BUILDINGS)
+        return {"id": self._id(), "name": f"{number//10+1}{number%10+1:02d}", "nameShort": f"{number//10+1}{number%10+1:02d}", "building": {"name": building, "address": ADDRESS_PREFIX+building}}
+
+    def _event(self, start: date, days: int) -> dict:
+        day=start+timedelta(days=self.rng.randrange(days))
+        if day.weekday()==6:  # no classes on sunday
+            day-=timedelta(days=1)
+        begin=moscow.localize(datetime.combine(day, self.rng.choice(STUDIES)))
+        type_id, format_id=self.rng.choice(TYPES)
+        return {
+            "id": self._id(), "start": begin, "end": begin+LESSON,
+            "course": self.rng.choice(self.courses) if self.rng.random()>0.05 else None,  # some events are not bound to a course and have their own name
+            "typeId": type_id, "formatId": format_id, "status": self.rng.choice(STATUSES),
+            "teacher": self.rng.choice(self.employees)["personId"] if self.employees else self._person()["id"],
+            "attendees": self.rng.choice(self.groups),
+            "room": self.rng.choice(self.rooms) if self.rooms and self.rng.random()>0.05 else None,  # online
+        }
+
+    def find_events(self, person_ids: list[str], time_min: datetime, time_max: datetime) -> list[dict]:
+        """Events of any of the people that start in [time_min, time_max), sorted by start, like the events search does."""
+        found={}
+        for person_id in person_ids:
+            for event in self.by_person.get(person_id, []):
+                if time_min<=event["start"]<time_max:
+                    found[event["id"]]=event
+        return sorted(found.values(), key=lambda event: event["start"])
+
+    def big_mess(self, events: list[dict]) -> dict:
+        """
+        Builds the _embedded of the events search for the events, with all the linked courses, organizers, attendees, persons and rooms.
+
+        Parameters:
+        - events (list): events of this university, e.g. from find_events.
+
+        Returns:
+        - dict: {"_embedded": {...}}
+        """
+        embedded={key: [] for key in ("events", "course-unit-realizations", "event-organizers", "event-attendees", "persons", "event-locations", "event-rooms", "rooms")}
+        courses, persons, rooms=set(), set(), set()
+        for event in events:
+            links={"self": _href(event["id"])}
+            item={"id": event["id"], "name": "Событие", "nameShort": "Соб.", "description": None, "typeId": event["typeId"], "formatId": event["formatId"],
+                  "start": event["start"].isoformat(), "end": event["end"].isoformat(), "startsAtLocal": event["start"].strftime("%Y-%m-%dT%H:%M:%S"), "endsAtLocal": event["end"].strftime("%Y-%m-%dT%H:%M:%S"),
+                  "holdingStatus": {"id": event["status"], "name": event["status"]}, "_links": links}
+            course=event["course"]
+            if course is not None:
+                links["course-unit-realization"]=_href(course["id"])
+                if course["id"] not in courses:
+                    courses.add(course["id"])
+                    embedded["course-unit-realizations"].append({**course, "_links": {"self": _href(course["id"])}})
+            embedded["events"].append(item)
+            # the teacher is an attendee too, the organizer points to his attendee record
+            teacher_attendee=self._link_id(event["id"], event["teacher"])
+            embedded["event-organizers"].append({"eventId": event["id"], "_links": {"self": _href(event["id"]), "event": _href(event["id"]), "event-attendees": _href(teacher_attendee)}})
+            for person_id, attendee_id, role in [(event["teacher"], teacher_attendee, "TEACH")]+[(person_id, self._link_id(event["id"], person_id), "STUDENT") for person_id in event["attendees"]]:
+                embedded["event-attendees"].append({"id": attendee_id, "eventId": event["id"], "roleId": role, "_links": {"self": _href(attendee_id), "event": _href(event["id"]), "person": _href(person_id)}})
+                if person_id not in persons:
+                    persons.add(person_id)
+                    embedded["persons"].append(self.persons[person_id])
+            room=event["room"]
+            if room is None:
+                embedded["event-locations"].append({"eventId": event["id"], "customLocation": "https://vks.narfu.ru/b/room", "_links": {"self": _href(event["id"])}})
+                continue
+            event_room_id=self._link_id(event["id"], room["id"])
+            embedded["event-locations"].append({"eventId": event["id"], "customLocation": None, "_links": {"self": _href(event["id"]), "event-rooms": _href(event_room_id)}})
+            embedded["event-rooms"].append({"id": event_room_id, "_links": {"self": _href(event_room_id), "event": _href(event["id"]), "room": _href(room["id"])}})
+            if room["id"] not in rooms:
+                rooms.add(room["id"])
+                embedded["rooms"].append({**room, "_links": {"self": _href(room["id"])}})
+        return {"_embedded": embedded}
+
+    @staticmethod
+    def _link_id(event_id: str, other_id: str) -> str:
+        # ids of the link records are derived, so the same event gives the same mess on every page and every request
+        return str(uuid.uuid5(uuid.UUID(event_id), other_id))
+
+    def search_persons(self, full_name: str, size: int=10) -> dict:
+        """Answers like the persons search: people whose full name contains the term, case insensitive, sorted by name."""
+        term=full_name.lower()
+        found=sorted((person for person in self.persons.values() if term in person["fullName"].lower()), key=lambda person: person["fullName"])[:size]
+        ids={person["id"] for person in found}
+        return {"_embedded": {
+            "persons": found,
+            "students": [student for student in self.students if student["personId"] in ids],
+            "employees": [employee for employee in self.employees if employee["personId"] in ids],
+        }, "page": {"size": size, "totalElements": len(found), "totalPages": 1, "number": 0}}
+
+    def who_goes(self, event_id: str) -> list[dict]|None:
+        """Answers like the attendees of an event, or None if there is no such event."""
+        event=self.by_id.get(event_id)
+        if event is None:
+            return None
+        result=[{"personId": event["teacher"], "fullName": self.persons[event["teacher"]]["fullName"], "roleId": "TEACHER", "specialtyName": None, "specialtyProfile": None}]
+        for person_id in event["attendees"]:
+            result.append({"personId": person_id, "fullName": self.persons[person_id]["fullName"], "roleId": "STUDENT", "specialtyName": self.student_by_id[person_id]["specialtyName"], "specialtyProfile": self.student_by_id[person_id]["specialtyProfile"]})
+        return result
+
+
+def generate_big_mess(events: int=2000, people: int=300, rooms: int=40, organizers: int=30, attendees_per_event: int=20, seed: int=0) -> dict:
+    """
+    Generates a response of the events search with all the events of a made up university. Handy for benchmarks of the parsers.
+    The arguments are the same as of FakeUniversity.
+
+    Returns:
+    - dict: {"_embedded": {...}} like modeus returns.
+    """
+    university=FakeUniversity(events, people, rooms, organizers, attendees_per_event, seed=seed)
+    return university.big_mess(university.events)
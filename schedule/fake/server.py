@@ -0,0 +1,202 @@
+# A local stand-in for modeus. It speaks the same endpoints as the real one, so the clients, Schedule and the apps run against it
+# with MODEUS_URL set, without credentials and network. Only the standard library, nothing to install.
+
+import json
+import time
+import base64
+import secrets
+import threading
+from datetime import datetime, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+from .generator import FakeUniversity
+
+API_PREFIX="/schedule-calendar-v2/api"
+
+
+def _b64(data: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(data).encode()).decode().rstrip("=")
+
+
+def make_token(person_id: str, email: str, lifetime: timedelta=timedelta(hours=12)) -> str:
+    """Makes an unsigned JWT that looks like the id_token of modeus. The client reads only exp from it."""
+    exp=int(time.time()+lifetime.total_seconds())
+    return ".".join([_b64({"alg": "none", "typ": "JWT"}), _b64({"sub": email, "person_id": person_id, "exp": exp}), "fake"])
+
+
+def _token_expired(token: str) -> bool:
+    try:
+        payload=token.split(".")[1]
+        payload+="="*(-len(payload)%4)
+        return json.loads(base64.urlsafe_b64decode(payload))["exp"]<time.time()
+    except (IndexError, ValueError, KeyError, TypeError):
+        return True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version="HTTP/1.1"  # keep-alive, so the pooling of the clients works like with the real server
+    server: "FakeModeusServer"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    #region responses
+    def _send(self, status: int, body: bytes=b"", content_type: str="text/html; charset=utf-8", headers: dict|None=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _html(self, html: str):
+        self._send(200, html.encode())
+
+    def _json(self, data, status: int=200):
+        self._send(status, json.dumps(data, ensure_ascii=False).encode(), "application/json")
+
+    def _redirect(self, location: str, headers: dict|None=None):
+        self._send(302, headers={"Location": location, **(headers or {})})
+    #endregion
+
+    def _body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def _form(self) -> dict:
+        return {key: values[0] for key, values in parse_qs(self._body().decode()).items()}
+
+    def _authorized(self) -> bool:
+        auth=self.headers.get("Authorization", "")
+        if not auth.startswith("Bearer ") or _token_expired(auth[7:]):
+            self._body()  # the connection is kept alive, an unread body would be taken for the next request
+            self._json({"error": "unauthorized"}, 401)
+            return False
+        return True
+
+    def do_GET(self):
+        url=urlsplit(self.path)
+        if url.path=="/oauth2/authorize":
+            # the real one redirects to adfs and sets tc01 cookie that adfs wants
+            self._redirect(f"{self.server.url}/adfs/ls/?SAMLRequest=fake", {"Set-Cookie": f"tc01={secrets.token_hex(8)}; Path=/"})
+        elif url.path=="/adfs/ls/":
+            if "tc01=" not in self.headers.get("Cookie", ""):
+                self._send(400, b"no tc01 cookie")
+                return
+            self._html(self.server.login_form())
+        elif url.path=="/":
+            self._html("<html><body>modeus</body></html>")  # the id_token is in the fragment of this url
+        elif url.path.startswith(API_PREFIX+"/calendar/events/") and url.path.endswith("/attendees"):
+            if not self._authorized():
+                return
+            attendees=self.server.university.who_goes(url.path[len(API_PREFIX+"/calendar/events/"):-len("/attendees")])
+            if attendees is None:
+                self._json({"error": "not found"}, 404)
+            else:
+                self._json(attendees)
+        else:
+            self._send(404, b"not found")
+
+    def do_POST(self):
+        url=urlsplit(self.path)
+        if url.path=="/adfs/ls/":
+            form=self._form()
+            if not self.server.check_credentials(form.get("UserName"), form.get("Password")):
+                self._html(self.server.login_form("Неверный идентификатор пользователя или пароль."))  # no hidden inputs, the client sees wrong credentials
+                return
+            self._html(self.server.saml_form(form["UserName"]))
+        elif url.path=="/commonauth":
+            form=self._form()
+            email=form.get("RelayState")
+            if "SAMLResponse" not in form or email is None:
+                self._send(400, b"bad saml")
+                return
+            self._redirect(f"{self.server.url}/#id_token={make_token(self.server.person_id, email)}&state=fake&session_state=fake")
+        elif url.path==API_PREFIX+"/calendar/events/search":
+            if not self._authorized():
+                return
+            self._json(self.server.search_events(json.loads(self._body())))
+        elif url.path==API_PREFIX+"/people/persons/search":
+            if not self._authorized():
+                return
+            request=json.loads(self._body())
+            self._json(self.server.university.search_persons(request.get("fullName", ""), int(request.get("size", 10))))
+        else:
+            self._send(404, b"not found")
+
+
+class FakeModeusServer(ThreadingHTTPServer):
+    """
+    Serves a FakeUniversity on the endpoints of modeus: the login with both forms and commonauth, the events search, the persons search and the attendees.
+    Point the clients to it with Endpoints.at(server.url) or MODEUS_URL environment variable.
+
+    Example:
+    with FakeModeusServer(FakeUniversity(events=5000)) as server:
+        client=ModeusClient(endpoints=Endpoints.at(server.url))
+    """
+    daemon_threads=True
+
+    def __init__(self, university: FakeUniversity|None=None, host: str="127.0.0.1", port: int=0, email: str|None=None, password: str|None=None, person_id: str|None=None, verbose: bool=False):
+        """
+        Parameters:
+        - university (FakeUniversity): the data to serve. A default one is generated if not given.
+        - host (str): the address to listen on.
+        - port (int): the port, 0 means any free one.
+        - email, password (str): the only accepted credentials. If not given, any credentials are accepted.
+        - person_id (str): who logs in. The first student by default.
+        - verbose (bool): log every request to stderr.
+        """
+        super().__init__((host, port), _Handler)
+        self.university=university if university is not None else FakeUniversity()
+        self.email=email
+        self.password=password
+        self.person_id=person_id if person_id is not None else (self.university.students[0]["personId"] if self.university.students else "")
+        self.verbose=verbose
+        self._thread=None
+
+    @property
+    def url(self) -> str:
+        host, port=self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def check_credentials(self, email: str|None, password: str|None) -> bool:
+        if not email or not password:
+            return False
+        return (self.email is None or email==self.email) and (self.password is None or password==self.password)
+
+    def login_form(self, error: str="") -> str:
+        # the client takes the action of the form with a regex, so it's on one line and is the last attribute
+        return f'<html><body><div class="error">{error}</div>\n<form method="post" id="loginForm" autocomplete="off" action="{self.url}/adfs/ls/?SAMLRequest=fake">\n<input id="userNameInput" name="UserName" type="email" />\n<input id="passwordInput" name="Password" type="password" />\n</form></body></html>'
+
+    def saml_form(self, email: str) -> str:
+        # the client takes the hidden inputs with a regex, so they look exactly like the ones of adfs
+        return f'<html><body><form method="POST" name="hiddenform" action="{self.url}/commonauth">\n<input type="hidden" name="SAMLResponse" value="{_b64({"email": email})}" />\n<input type="hidden" name="RelayState" value="{email}" />\n</form></body></html>'
+
+    def search_events(self, request: dict) -> dict:
+        """Answers the events search: events of the attendees in the time range, one page of them."""
+        size=int(request.get("size", 500))
+        page=int(request.get("page", 0))
+        events=self.university.find_events(request.get("attendeePersonId", []), datetime.fromisoformat(request["timeMin"]), datetime.fromisoformat(request["timeMax"]))
+        result=self.university.big_mess(events[page*size:(page+1)*size])
+        result["page"]={"size": size, "totalElements": len(events), "totalPages": -(-len(events)//size), "number": page}
+        return result
+
+    def start(self) -> "FakeModeusServer":
+        """Serves in a background thread."""
+        self._thread=threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread=None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
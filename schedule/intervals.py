@@ -0,0 +1,196 @@
+# Time intervals of many schedules at once: when everybody is busy and when everybody is free.
+# Everything is a sweep over sorted intervals, so dozens of semester schedules are handled in linear time after sorting.
+
+from dataclasses import dataclass
+from datetime import datetime, date, time, timedelta
+from typing import Iterable
+from operator import itemgetter
+from .parsers.events import Events, STUDIES, study_to_number, combine_moscow
+from .parsers.russian_date import russian_date
+
+LESSON=timedelta(minutes=90)  # a pair lasts an hour and a half, bells give only the starts
+DAY_START=STUDIES[0]
+DAY_END=(datetime.combine(date.min, STUDIES[-1])+LESSON).time()  # the end of the last pair
+
+
+@dataclass(frozen=True, slots=True)
+class FreeSlot:
+    """
+    A time when all the people are free.
+
+    Attributes:
+    - start (datetime): aware start.
+    - end (datetime): aware end.
+    - event_num (int): number of the pair that starts at start, or -1 if it doesn't start at a bell.
+    """
+    start: datetime
+    end: datetime
+    event_num: int=-1
+
+    @property
+    def duration(self) -> timedelta:
+        return self.end-self.start
+
+    def __str__(self):  # human readable in russian
+        pair=f"пара {self.event_num}, " if self.event_num>0 else ""
+        return f"{russian_date(self.start.date())}: {pair}с {self.start:%H:%M} до {self.end:%H:%M}"
+
+
+def busy_intervals(schedules: Iterable[Events]) -> list[tuple[datetime, datetime]]:
+    """
+    Merges the events of all the schedules into intervals when at least one person is busy.
+
+    Parameters:
+    - schedules (iterable): Events of every person.
+
+    Returns:
+    - list: (start, end) pairs, sorted and not overlapping. Touching intervals are merged too.
+    """
+    # every schedule is sorted already, so timsort just merges the runs
+    intervals=sorted((event.start_datetime, event.end_datetime) for events in schedules for event in events)
+    merged=[]
+    for start, end in intervals:
+        if merged and start<=merged[-1][1]:
+            if end>merged[-1][1]:
+                merged[-1]=(merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def free_windows(busy: list[tuple[datetime, datetime]], start: datetime, end: datetime, day_start: time=DAY_START, day_end: time=DAY_END, skip_sunday: bool=True) -> list[tuple[datetime, datetime]]:
+    """
+    Finds the gaps between busy intervals within the working hours of every day.
+
+    Parameters:
+    - busy (list): sorted, not overlapping (start, end) pairs, e.g. from busy_intervals.
+    - start, end (datetime): aware range to look in.
+    - day_start, day_end (time): working hours. Nobody wants a consultation at night.
+    - skip_sunday (bool): don't look on sundays.
+
+    Returns:
+    - list: maximal free (start, end) pairs, sorted.
+    """
+    windows=[]
+    i=0
+    day=start.date()
+    while day<=end.date():
+        if not (skip_sunday and day.weekday()==6):
+            lo=max(start, combine_moscow(day, day_start))
+            hi=min(end, combine_moscow(day, day_end))
+            while i<len(busy) and busy[i][1]<=lo:  # busy intervals are never looked at again after their day, so it's linear
+                i+=1
+            cursor=lo
+            j=i
+            while j<len(busy) and busy[j][0]<hi:
+                if busy[j][0]>cursor:
+                    windows.append((cursor, busy[j][0]))
+                cursor=max(cursor, busy[j][1])
+                j+=1
+            if cursor<hi:
+                windows.append((cursor, hi))
+        day+=timedelta(days=1)
+    return windows
+
+
+def free_slots(schedules: Iterable[Events], start: datetime, end: datetime, min_duration: timedelta=LESSON, grid: str="bells", day_start: time=DAY_START, day_end: time=DAY_END, skip_sunday: bool=True) -> list[FreeSlot]:
+    """
+    Finds the times when all the people are free.
+
+    Parameters:
+    - schedules (iterable): Events of every person.
+    - start, end (datetime): aware range to look in.
+    - min_duration (timedelta): how long the free time must be.
+    - grid (str): "bells" gives slots that start at a bell of STUDIES and last min_duration, but at least a pair, every bell separately.
+      "minutes" gives the whole free windows that are at least min_duration long.
+    - day_start, day_end (time): working hours.
+    - skip_sunday (bool): don't look on sundays.
+
+    Returns:
+    - list: FreeSlot sorted by start.
+
+    Raises:
+    - ValueError: if grid is unknown.
+    """
+    if grid not in ("bells", "minutes"):
+        raise ValueError(f"Unknown grid {grid}. Use bells or minutes.")
+    windows=free_windows(busy_intervals(schedules), start, end, day_start, day_end, skip_sunday)
+    if grid=="minutes":
+        return [FreeSlot(lo, hi, study_to_number(lo.time())) for lo, hi in windows if hi-lo>=min_duration]
+    length=max(min_duration, LESSON)
+    slots=[]
+    for lo, hi in windows:
+        for bell in STUDIES:
+            slot_start=combine_moscow(lo.date(), bell)
+            if lo<=slot_start and slot_start+length<=hi:
+                slots.append(FreeSlot(slot_start, slot_start+length, study_to_number(bell)))
+    return slots
+
+
+@dataclass(frozen=True, slots=True)
+class Overlap:
+    """
+    A time when everybody is busy at once.
+
+    Attributes:
+    - start (datetime): aware start.
+    - end (datetime): aware end.
+    - events (tuple): the event of every schedule that goes at this time, in the order of the schedules. The same event on both sides is a common class.
+    """
+    start: datetime
+    end: datetime
+    events: tuple
+
+    @property
+    def duration(self) -> timedelta:
+        return self.end-self.start
+
+    @property
+    def common(self) -> bool:
+        """Whether everybody is on the same event, not just busy at the same time."""
+        return len(set(self.events))==1  # events are equal by id
+
+    def __str__(self):  # human readable in russian
+        names=", ".join(dict.fromkeys(event.event_name for event in self.events))  # the same class is named once
+        return f"{russian_date(self.start.date())}: с {self.start:%H:%M} до {self.end:%H:%M} — {names}"
+
+
+def _intersect(left: list[tuple], right: list[tuple]) -> list[tuple]:
+    # a sweep over two lists of (start, end, events) sorted by start. Events of one side may overlap each other (two classes at once happen),
+    # so every side keeps the started and not ended yet ones. Those are only the ones that go at the same time, so it's linear in practice.
+    result=[]
+    active=([], [])
+    i=j=0
+    while i<len(left) or j<len(right):
+        side=0 if j>=len(right) or (i<len(left) and left[i][0]<=right[j][0]) else 1
+        item=left[i] if side==0 else right[j]
+        if side==0:
+            i+=1
+        else:
+            j+=1
+        start, end, events=item
+        others=active[1-side]
+        others[:]=[other for other in others if other[1]>start]  # everything that ended before this start won't overlap anything later
+        for other in others:  # they all started not later, so the overlap starts here and the result stays sorted by start
+            hi=min(end, other[1])
+            result.append((start, hi, events+other[2] if side==0 else other[2]+events))
+        active[side].append(item)
+    return result
+
+
+def overlaps(schedules: Iterable[Events]) -> list[Overlap]:
+    """
+    Intersects the schedules by time: finds the spans when every person is on some event.
+
+    Parameters:
+    - schedules (iterable): Events of every person, at least one.
+
+    Returns:
+    - list: Overlap sorted by start, one for every combination of events that go at the same time.
+    """
+    result=None
+    for events in schedules:
+        items=[(event.start_datetime, event.end_datetime, (event,)) for event in events if event.start_datetime<event.end_datetime]
+        items.sort(key=itemgetter(0))  # Events are sorted by start almost always, then it's linear
+        result=items if result is None else _intersect(result, items)
+    return [Overlap(start, end, events) for start, end, events in result or []]
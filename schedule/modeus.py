@@ -1,72 +1,653 @@
 import httpx
 import re
+import os
+import importlib.util
 from datetime import datetime
 from pytz import UTC
-from functools import lru_cache, partial
-import asyncio
 import time
 import logging
+import asyncio
+from .resilience import TokenBucket, RetryPolicy, CircuitBreaker, Connectivity
+from .parsers.stream import decode_big_mess
+from .cache import TTLCache, cached_method
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from copy import deepcopy
+
+HTTP2_AVAILABLE=importlib.util.find_spec("h2") is not None  # httpx needs it for http/2, but it's optional
+
+AUTH_PARAMS = {
+    "client_id":"YDNCeCPsf1zL2etGQflijyfzo88a",
+    "redirect_uri":"https://narfu.modeus.org/",
+    "response_type":"id_token",
+    "scope":"openid",
+    "state":"abab35fcb9164912aa46d287a594a338",
+    "nonce":"08cd3a21e9724040acb48cf3a35b0c4b"
+}
+AUTHORIZE_URL = "https://narfu-auth.modeus.org/oauth2/authorize"
+COMMONAUTH_URL = "https://narfu-auth.modeus.org:443/commonauth"
+API_URL = "https://narfu.modeus.org/schedule-calendar-v2/api"
+PAGE_SIZE = 500  # modeus doesn't give more events per page
+AUTH_STATUSES = (401, 403)  # modeus rejected the token
+
+
+@dataclass(frozen=True)
+class Endpoints:
+    """
+    Where modeus lives. The defaults are the real narfu servers.
+    Set MODEUS_URL environment variable (e.g. in .env) to run everything against another server, like the fake one from schedule.fake.
+    """
+    authorize: str = AUTHORIZE_URL
+    commonauth: str = COMMONAUTH_URL
+    api: str = API_URL
+
+    @classmethod
+    def at(cls, base_url: str) -> "Endpoints":
+        """All the endpoints on one server, with the same paths as the real modeus has."""
+        base_url=base_url.rstrip("/")
+        return cls(f"{base_url}/oauth2/authorize", f"{base_url}/commonauth", f"{base_url}/schedule-calendar-v2/api")
+
+    @classmethod
+    def from_env(cls) -> "Endpoints":
+        """The server from MODEUS_URL environment variable, or the real modeus if it's not set."""
+        base_url=os.getenv("MODEUS_URL")
+        return cls.at(base_url) if base_url else cls()
+
+#region request builders and parsers shared by the sync and async clients
+def _credentials(email: str, password: str) -> dict:
+    return {
+        "UserName":email,
+        "Password":password,
+        "AuthMethod":"FormsAuthentication"
+    }
 
-def modeus_parse_token(email: str, password: str) -> str:
+def _form1_url(form1: str) -> str:
+    form1_url_match = re.search(r'<form.*action="(https?:.+)".*>', form1)
+    if not form1_url_match:
+        raise RuntimeError("modeus login: can't parse 1st form")
+    return form1_url_match.group(1)
+
+def _form2_data(form2: str) -> dict|None:
+    """Returns hidden inputs of the 2nd form or None if there is no 2nd form (wrong credentials)."""
+    form2_matches = re.findall(r'<input type="hidden" name="(.+?)" value="(.+?)" \/>', form2)
+    if len(form2_matches) < 2:
+        return None
+    return dict(form2_matches)
+
+def _id_token(last_url: str) -> str:
+    id_token_match = re.search(r'#id_token=(.+?)&', last_url)
+    if not id_token_match:
+        raise RuntimeError("modeus login: can't parse id_token")
+    return id_token_match.group(1)
+
+def _schedule_request(api_url: str, person_id: str|list[str], start_time: datetime, end_time: datetime, page: int=0) -> tuple[str, dict]:
+    if end_time<=start_time:
+        raise ValueError("End time must be greater than start time!")
+    url = f"{api_url}/calendar/events/search?tz=Europe/Moscow"
+    # "/" must not be encoded
+    request_json = {
+        "size": PAGE_SIZE,
+        "page": page,
+        "timeMin": start_time.astimezone(UTC).isoformat(timespec='seconds'),
+        "timeMax": end_time.astimezone(UTC).isoformat(timespec='seconds'),
+        "attendeePersonId": [person_id,] if isinstance(person_id, str) else list(person_id)
+    }
+    return url, request_json
+
+def _total_pages(j: dict) -> int:
+    """Reads the page metadata of the response. Modeus answers like spring: {"page": {"size": 500, "totalElements": 1234, "totalPages": 3, "number": 0}}."""
+    page = j.get("page") or {}
+    if "totalPages" in page:
+        return max(int(page["totalPages"]), 1)
+    if "totalElements" in page:
+        size = page.get("size") or PAGE_SIZE
+        return max(-(-int(page["totalElements"])//size), 1)  # ceil
+    return 1
+
+def merge_embedded(pages: list[dict]) -> dict:
     """
-    Parse id_token from modeus server.
+    Merges several pages of the events search into one response, as if modeus returned everything at once.
+    Persons, rooms and other linked things repeat on every page, so items with the same id are taken only once.
 
     Parameters:
-    email (str): email.
-    password (str): password.
+    pages (list): responses of the events search, the first page first.
 
     Returns:
-    str: id_token.
+    dict: one response with merged _embedded.
+    """
+    if len(pages)==1:
+        return pages[0]
+    merged={}
+    seen={}
+    for page in pages:
+        for key, items in page["_embedded"].items():
+            lst=merged.setdefault(key, [])
+            ids=seen.setdefault(key, set())
+            for item in items:
+                item_id=item.get("id") if isinstance(item, dict) else None
+                if item_id is not None:
+                    if item_id in ids:
+                        continue
+                    ids.add(item_id)
+                lst.append(item)
+    result=dict(pages[0])
+    result["_embedded"]=merged
+    return result
+
+def _search_request(api_url: str, term: str, by_id: bool) -> tuple[str, dict]:
+    mode="id" if by_id else "fullName"
+    request_json = {
+        "size": 10,
+        mode: term,
+        "sort": "+fullName"
+    }
+    return f"{api_url}/people/persons/search", request_json
 
-    Raises:
-    RuntimeError: if can't parse 1st form, 2nd form or id_token.
+def _who_goes_url(api_url: str, event_id: str) -> str:
+    return f"{api_url}/calendar/events/{event_id}/attendees"
+
+def _embedded(j: dict, error: str) -> dict:
+    if "_embedded" in j: return j
+    else: raise RuntimeError(error)
+
+def _sync_chunks(chunks, loop: asyncio.AbstractEventLoop):
+    """Lets a worker thread pull the chunks of an async response from the event loop, one by one."""
+    async def next_chunk():
+        return await chunks.__anext__()
+    while True:
+        try:
+            yield asyncio.run_coroutine_threadsafe(next_chunk(), loop).result()
+        except StopAsyncIteration:
+            return
+
+def _limits(max_connections: int, keepalive_expiry: float) -> httpx.Limits:
+    return httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections, keepalive_expiry=keepalive_expiry)
+
+def _use_http2(http2: bool) -> bool:
+    if http2 and not HTTP2_AVAILABLE:
+        logging.warning("http2 requested, but h2 package is not installed. Falling back to http/1.1.")
+    return http2 and HTTP2_AVAILABLE
+
+#endregion
+
+
+class ModeusClient:
+    """
+    A long-lived session with modeus. It keeps the connection pool alive between the calls, so only the first request pays for TCP+TLS handshake.
+    The token is stored once in the session and injected into every api call.
     """
-    with httpx.Client(timeout=10) as client:
-        params = {
-            "client_id":"YDNCeCPsf1zL2etGQflijyfzo88a",
-            "redirect_uri":"https://narfu.modeus.org/",
-            "response_type":"id_token",
-            "scope":"openid",
-            "state":"abab35fcb9164912aa46d287a594a338",
-            "nonce":"08cd3a21e9724040acb48cf3a35b0c4b"
+    def __init__(self, token: str|None=None, timeout: float=10, http2: bool=False, max_connections: int=10, keepalive_expiry: float=60, rate_limiter: TokenBucket=None, retry: RetryPolicy=None, breaker: CircuitBreaker=None, connectivity: Connectivity=None, endpoints: Endpoints=None):
+        """
+        Parameters:
+        token (str): modeus token. Can be set later by login or by assigning the token attribute.
+        timeout (float): timeout of every request in seconds.
+        http2 (bool): use http/2 if the h2 package is installed.
+        max_connections (int): maximum number of pooled connections.
+        keepalive_expiry (float): how long an idle connection stays in the pool, in seconds.
+        rate_limiter (TokenBucket): limits requests of all the endpoints. Pass the same object to several clients to share the limit.
+        retry (RetryPolicy): how transient errors and 5xx responses are retried.
+        breaker (CircuitBreaker): stops calling modeus while it's down.
+        connectivity (Connectivity): learns from the calls whether we are online, and stops calling while we are not.
+        endpoints (Endpoints): urls of modeus. If not given, they are taken from MODEUS_URL environment variable or are the real ones.
+        """
+        self.client=httpx.Client(timeout=timeout, http2=_use_http2(http2), limits=_limits(max_connections, keepalive_expiry))
+        self.max_connections=max_connections
+        self.token=token
+        self.rate_limiter=rate_limiter if rate_limiter is not None else TokenBucket()
+        self.retry=retry if retry is not None else RetryPolicy()
+        self.breaker=breaker if breaker is not None else CircuitBreaker()
+        self.connectivity=connectivity if connectivity is not None else Connectivity()
+        self.endpoints=endpoints if endpoints is not None else Endpoints.from_env()
+        self.search_cache=TTLCache(600, maxsize=256)  # search_person results of this client
+        self.who_goes_cache=TTLCache(300, maxsize=128)
+        self.on_unauthorized=None  # called with the rejected token when modeus rejects it, must log in again. Schedule sets it
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Closes the pooled connections."""
+        self.client.close()
+
+    @property
+    def headers(self) -> dict:
+        """Headers for the api calls with the bearer token."""
+        return {
+            "Content-type": "application/json",
+            "Authorization": f"Bearer {self.token}"
         }
-        url = "https://narfu-auth.modeus.org/oauth2/authorize"
-        before_form1_response = client.get(url, params=params)
+
+    def _request(self, method: str, url, stream: bool=False, follow_redirects: bool=False, **kwargs) -> httpx.Response:
+        """
+        Sends a request through the rate limiter, the circuit breaker and the retry policy.
+        If stream is True, the body is not read, and the caller must close the response.
+        If modeus rejects the token with 401 or 403 and on_unauthorized is set, it's called to log in again, and the request is sent once more with the new token.
+
+        Raises:
+        OfflineError: if the last call showed there is no network, without waiting for a timeout.
+        CircuitOpenError: if modeus is considered down.
+        httpx.TransportError: if the network failed on every try.
+        httpx.HTTPStatusError: if modeus answered 5xx or 429 on every try.
+        """
+        attempt=0
+        reauthorized=False
+        while True:
+            if attempt==0:  # retries of this request are up to the retry policy
+                self.connectivity.check()
+            rejected=None
+            trial=self.breaker.before_call()
+            try:
+                self.rate_limiter.acquire()
+                try:
+                    response=self.client.send(self.client.build_request(method, url, **kwargs), stream=stream, follow_redirects=follow_redirects)
+                except httpx.TransportError as e:
+                    self.breaker.record_failure()
+                    self.connectivity.record_failure()
+                    delay=self.retry.delay(attempt)
+                    if delay is None:
+                        raise e
+                else:
+                    self.connectivity.record_success()  # any answer means the network is fine, even if modeus is not
+                    if not self.retry.retryable(response.status_code):
+                        self.breaker.record_success()
+                        auth=kwargs.get("headers", {}).get("Authorization")
+                        if response.status_code not in AUTH_STATUSES or auth is None or reauthorized or self.on_unauthorized is None:
+                            return response
+                        rejected=auth[len("Bearer "):]  # the token died before its exp, e.g. the password was changed
+                        response.close()
+                    else:
+                        self.breaker.record_failure()
+                        delay=self.retry.delay(attempt, response.headers.get("Retry-After"))
+                        response.close()
+                        if delay is None:
+                            response.raise_for_status()
+            except BaseException:
+                # cancelled, interrupted or an error that is not about the network. Without this a trial call would hold the breaker half-open forever
+                self.breaker.release(trial)
+                raise
+            if rejected is not None:
+                self.on_unauthorized(rejected)
+                kwargs["headers"]={**kwargs["headers"], **self.headers}  # the same request with the new token, once
+                reauthorized=True
+                continue
+            logging.info(f"Retrying {method} {url} in {delay:.2f} seconds")
+            time.sleep(delay)
+            attempt+=1
+
+    def _submit_credentials(self, email: str, password: str) -> str:
+        """Goes through the authorize redirect and the 1st form. Returns the html of the 2nd form."""
+        before_form1_response = self._request("GET", self.endpoints.authorize, params=AUTH_PARAMS)
         cookies = httpx.Cookies()
         cookies.set(
             'tc01', before_form1_response.cookies['tc01']
         )
-        form1_response = client.get(
-            before_form1_response.next_request.url,
+        form1_response = self._request(
+            "GET", before_form1_response.next_request.url,
             cookies=cookies
         )
-        form1 = form1_response.text
-        form1_url_match = re.search(r'<form.*action="(https:.+)".*>', form1)
-        if not form1_url_match:
-            raise RuntimeError("modeus_parse_token: can't parse 1st form")
-        form1_url = form1_url_match.group(1)
-        data = {
-            "UserName":email,
-            "Password":password,
-            "AuthMethod":"FormsAuthentication"
-        }
-        form2_response = client.post(
-            form1_url, data=data, cookies=httpx.Cookies(), follow_redirects=True,
+        form2_response = self._request(
+            "POST", _form1_url(form1_response.text), data=_credentials(email, password), cookies=httpx.Cookies(), follow_redirects=True,
             headers=dict(Referer=str(form1_response.url))
         )
-        form2 = form2_response.text
-        form2_matches = re.findall(r'<input type="hidden" name="(.+?)" value="(.+?)" \/>', form2)
-        if len(form2_matches) < 2:
-            raise RuntimeError("modeus_parse_token: can't parse 2nd form")
-        data = dict(form2_matches)
-        url="https://narfu-auth.modeus.org:443/commonauth"
-        last_response = client.post(url, data=data, follow_redirects=True)
-        last_url = str(last_response.url)
-        id_token_match = re.search(r'#id_token=(.+?)&', last_url)
-        if not id_token_match:
-            raise RuntimeError("modeus_parse_token: can't parse id_token")
-        id_token = id_token_match.group(1)
-        return id_token
+        return form2_response.text
+
+    def login(self, email: str, password: str) -> str:
+        """
+        Parse id_token from modeus server and store it in the session.
+
+        Parameters:
+        email (str): email.
+        password (str): password.
+
+        Returns:
+        str: id_token.
+
+        Raises:
+        RuntimeError: if can't parse 1st form, 2nd form or id_token.
+        """
+        self.client.cookies.clear()  # every login starts from scratch, like a fresh browser
+        try:
+            data = _form2_data(self._submit_credentials(email, password))
+            if data is None:
+                raise RuntimeError("modeus login: can't parse 2nd form")
+            last_response = self._request("POST", self.endpoints.commonauth, data=data, follow_redirects=True)
+        finally:
+            self.client.cookies.clear()  # don't send auth cookies to the api
+        self.token = _id_token(str(last_response.url))
+        return self.token
+
+    def check_credentials(self, email: str, password: str) -> bool:
+        """
+        Check if user's credentials are correct. Does not change the session token.
+
+        Returns:
+        bool: True if credentials are correct, False otherwise.
+
+        Raises:
+        RuntimeError: if can't parse 1st form.
+        """
+        self.client.cookies.clear()
+        try:
+            return _form2_data(self._submit_credentials(email, password)) is not None
+        finally:
+            self.client.cookies.clear()
+
+    def get_schedule(self, person_id: str|list[str], start_time: datetime, end_time: datetime) -> dict:
+        """
+        Get schedule of a person.
+
+        Parameters:
+        person_id (str|list): person id. A list of ids gets the events of all of them in one request.
+        start_time (datetime): start time.
+        end_time (datetime): end time.
+
+        Returns:
+        dict: huge json with schedule. If there are more events than fit in one page, the other pages are fetched concurrently and merged in.
+
+        Raises:
+        ValueError: if start_time >= end_time.
+        RuntimeError: if can't find key embedded.
+        """
+        first = self._schedule_page(person_id, start_time, end_time, 0)
+        total = _total_pages(first)
+        if total==1:
+            return first
+        # the rest of the pages are fetched all at once over the pooled connections
+        with ThreadPoolExecutor(max_workers=min(total-1, self.max_connections)) as pool:
+            rest = list(pool.map(lambda page: self._schedule_page(person_id, start_time, end_time, page), range(1, total)))
+        return merge_embedded([first, *rest])
+
+    def _schedule_page(self, person_id: str|list[str], start_time: datetime, end_time: datetime, page: int) -> dict:
+        url, request_json = _schedule_request(self.endpoints.api, person_id, start_time, end_time, page)
+        response = self._request("POST", url, stream=True, json=request_json, headers=self.headers)
+        try:
+            # the body is decoded while it comes, and the parts of the mess we don't use are dropped on the way
+            j = decode_big_mess(response.iter_text())
+        finally:
+            response.close()
+        return _embedded(j, "No key embedded")
+
+    @cached_method("search_cache", copy=deepcopy)  # people don't change their names every minute. The json is copied, so nobody changes the cached one
+    def search_person(self, term: str, by_id: bool) -> dict:
+        """
+        Search person in the university database.
+
+        Parameters:
+        term (str): search term.
+        by_id (bool): search by id or by full name.
+
+        Returns:
+        dict: huge json with search results.
+
+        Raises:
+        RuntimeError: if can't find key embedded.
+        """
+        if by_id:
+            logging.warning("Search by id is not implemented yet. Returning empty result.")
+            return {"_embedded": {"persons": []}}
+        url, request_json = _search_request(self.endpoints.api, term, by_id)
+        response = self._request("POST", url, json=request_json, headers=self.headers)
+        j=response.json()
+        return _embedded(j, f"No key embedded! {j}")
+
+    @cached_method("who_goes_cache", copy=deepcopy)
+    def who_goes(self, event_id: str) -> dict:
+        """
+        Get attendees of an event.
+
+        Parameters:
+        event_id (str): event id.
+
+        Returns:
+        dict: huge json with attendees.
+        """
+        response = self._request("GET", _who_goes_url(self.endpoints.api, event_id), headers=self.headers)
+        return response.json()
+
+
+class AsyncModeusClient:
+    """
+    Asyncio twin of ModeusClient. One httpx.AsyncClient is shared by all the calls, so many coroutines can talk to modeus at once without blocking the event loop.
+    """
+    def __init__(self, token: str|None=None, timeout: float=10, http2: bool=False, max_connections: int=10, keepalive_expiry: float=60, rate_limiter: TokenBucket=None, retry: RetryPolicy=None, breaker: CircuitBreaker=None, connectivity: Connectivity=None, endpoints: Endpoints=None):
+        """
+        Parameters:
+        token (str): modeus token. Can be set later by login or by assigning the token attribute.
+        timeout (float): timeout of every request in seconds.
+        http2 (bool): use http/2 if the h2 package is installed.
+        max_connections (int): maximum number of pooled connections.
+        keepalive_expiry (float): how long an idle connection stays in the pool, in seconds.
+        rate_limiter (TokenBucket): limits requests of all the endpoints. Pass the same object to several clients to share the limit.
+        retry (RetryPolicy): how transient errors and 5xx responses are retried.
+        breaker (CircuitBreaker): stops calling modeus while it's down.
+        connectivity (Connectivity): learns from the calls whether we are online, and stops calling while we are not.
+        endpoints (Endpoints): urls of modeus. If not given, they are taken from MODEUS_URL environment variable or are the real ones.
+        """
+        self.client=httpx.AsyncClient(timeout=timeout, http2=_use_http2(http2), limits=_limits(max_connections, keepalive_expiry))
+        self.max_connections=max_connections
+        self.token=token
+        self.rate_limiter=rate_limiter if rate_limiter is not None else TokenBucket()
+        self.retry=retry if retry is not None else RetryPolicy()
+        self.breaker=breaker if breaker is not None else CircuitBreaker()
+        self.connectivity=connectivity if connectivity is not None else Connectivity()
+        self.endpoints=endpoints if endpoints is not None else Endpoints.from_env()
+        self.search_cache=TTLCache(600, maxsize=256)  # search_person results of this client
+        self.who_goes_cache=TTLCache(300, maxsize=128)
+        self.on_unauthorized=None  # called with the rejected token when modeus rejects it, must log in again. Schedule sets it
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def aclose(self):
+        """Closes the pooled connections."""
+        await self.client.aclose()
+
+    headers = ModeusClient.headers
+
+    async def _request(self, method: str, url, stream: bool=False, follow_redirects: bool=False, **kwargs) -> httpx.Response:
+        """
+        Sends a request through the rate limiter, the circuit breaker and the retry policy.
+        If stream is True, the body is not read, and the caller must close the response.
+        If modeus rejects the token with 401 or 403 and on_unauthorized is set, it's called to log in again, and the request is sent once more with the new token.
+
+        Raises:
+        OfflineError: if the last call showed there is no network, without waiting for a timeout.
+        CircuitOpenError: if modeus is considered down.
+        httpx.TransportError: if the network failed on every try.
+        httpx.HTTPStatusError: if modeus answered 5xx or 429 on every try.
+        """
+        attempt=0
+        reauthorized=False
+        while True:
+            if attempt==0:  # retries of this request are up to the retry policy
+                self.connectivity.check()
+            rejected=None
+            trial=self.breaker.before_call()
+            try:
+                await self.rate_limiter.acquire_async()
+                try:
+                    response=await self.client.send(self.client.build_request(method, url, **kwargs), stream=stream, follow_redirects=follow_redirects)
+                except httpx.TransportError as e:
+                    self.breaker.record_failure()
+                    self.connectivity.record_failure()
+                    delay=self.retry.delay(attempt)
+                    if delay is None:
+                        raise e
+                else:
+                    self.connectivity.record_success()  # any answer means the network is fine, even if modeus is not
+                    if not self.retry.retryable(response.status_code):
+                        self.breaker.record_success()
+                        auth=kwargs.get("headers", {}).get("Authorization")
+                        if response.status_code not in AUTH_STATUSES or auth is None or reauthorized or self.on_unauthorized is None:
+                            return response
+                        rejected=auth[len("Bearer "):]  # the token died before its exp, e.g. the password was changed
+                        await response.aclose()
+                    else:
+                        self.breaker.record_failure()
+                        delay=self.retry.delay(attempt, response.headers.get("Retry-After"))
+                        await response.aclose()
+                        if delay is None:
+                            response.raise_for_status()
+            except BaseException:
+                # cancelled, interrupted or an error that is not about the network. Without this a trial call would hold the breaker half-open forever
+                self.breaker.release(trial)
+                raise
+            if rejected is not None:
+                await self.on_unauthorized(rejected)
+                kwargs["headers"]={**kwargs["headers"], **self.headers}  # the same request with the new token, once
+                reauthorized=True
+                continue
+            logging.info(f"Retrying {method} {url} in {delay:.2f} seconds")
+            await asyncio.sleep(delay)
+            attempt+=1
+
+    async def _submit_credentials(self, email: str, password: str) -> str:
+        """Goes through the authorize redirect and the 1st form. Returns the html of the 2nd form."""
+        before_form1_response = await self._request("GET", self.endpoints.authorize, params=AUTH_PARAMS)
+        cookies = httpx.Cookies()
+        cookies.set(
+            'tc01', before_form1_response.cookies['tc01']
+        )
+        form1_response = await self._request(
+            "GET", before_form1_response.next_request.url,
+            cookies=cookies
+        )
+        form2_response = await self._request(
+            "POST", _form1_url(form1_response.text), data=_credentials(email, password), cookies=httpx.Cookies(), follow_redirects=True,
+            headers=dict(Referer=str(form1_response.url))
+        )
+        return form2_response.text
+
+    async def login(self, email: str, password: str) -> str:
+        """
+        Parse id_token from modeus server and store it in the session.
+
+        Parameters:
+        email (str): email.
+        password (str): password.
+
+        Returns:
+        str: id_token.
+
+        Raises:
+        RuntimeError: if can't parse 1st form, 2nd form or id_token.
+        """
+        self.client.cookies.clear()
+        try:
+            data = _form2_data(await self._submit_credentials(email, password))
+            if data is None:
+                raise RuntimeError("modeus login: can't parse 2nd form")
+            last_response = await self._request("POST", self.endpoints.commonauth, data=data, follow_redirects=True)
+        finally:
+            self.client.cookies.clear()
+        self.token = _id_token(str(last_response.url))
+        return self.token
+
+    async def check_credentials(self, email: str, password: str) -> bool:
+        """
+        Check if user's credentials are correct. Does not change the session token.
+
+        Returns:
+        bool: True if credentials are correct, False otherwise.
+        """
+        self.client.cookies.clear()
+        try:
+            return _form2_data(await self._submit_credentials(email, password)) is not None
+        finally:
+            self.client.cookies.clear()
+
+    async def get_schedule(self, person_id: str|list[str], start_time: datetime, end_time: datetime) -> dict:
+        """
+        Get schedule of a person.
+
+        Parameters:
+        person_id (str|list): person id. A list of ids gets the events of all of them in one request.
+        start_time (datetime): start time.
+        end_time (datetime): end time.
+
+        Returns:
+        dict: huge json with schedule. If there are more events than fit in one page, the other pages are fetched concurrently and merged in.
+
+        Raises:
+        ValueError: if start_time >= end_time.
+        RuntimeError: if can't find key embedded.
+        """
+        first = await self._schedule_page(person_id, start_time, end_time, 0)
+        total = _total_pages(first)
+        if total==1:
+            return first
+        rest = await asyncio.gather(*(self._schedule_page(person_id, start_time, end_time, page) for page in range(1, total)))
+        return merge_embedded([first, *rest])
+
+    async def _schedule_page(self, person_id: str|list[str], start_time: datetime, end_time: datetime, page: int) -> dict:
+        url, request_json = _schedule_request(self.endpoints.api, person_id, start_time, end_time, page)
+        response = await self._request("POST", url, stream=True, json=request_json, headers=self.headers)
+        try:
+            # decoding is done in a thread that pulls the chunks from the event loop, so the loop is not blocked by parsing
+            j = await asyncio.to_thread(decode_big_mess, _sync_chunks(response.aiter_text(), asyncio.get_running_loop()))
+        finally:
+            await response.aclose()
+        return _embedded(j, "No key embedded")
+
+    @cached_method("search_cache", copy=deepcopy)
+    async def search_person(self, term: str, by_id: bool) -> dict:
+        """
+        Search person in the university database.
+
+        Parameters:
+        term (str): search term.
+        by_id (bool): search by id or by full name.
+
+        Returns:
+        dict: huge json with search results.
+        """
+        if by_id:
+            logging.warning("Search by id is not implemented yet. Returning empty result.")
+            return {"_embedded": {"persons": []}}
+        url, request_json = _search_request(self.endpoints.api, term, by_id)
+        response = await self._request("POST", url, json=request_json, headers=self.headers)
+        j=response.json()
+        return _embedded(j, f"No key embedded! {j}")
+
+    @cached_method("who_goes_cache", copy=deepcopy)
+    async def who_goes(self, event_id: str) -> dict:
+        """
+        Get attendees of an event.
+
+        Parameters:
+        event_id (str): event id.
+
+        Returns:
+        dict: huge json with attendees.
+        """
+        response = await self._request("GET", _who_goes_url(self.endpoints.api, event_id), headers=self.headers)
+        return response.json()
+
+
+# one-shot functions. They open a session for a single call, use ModeusClient if you make many calls.
+
+def modeus_parse_token(email: str, password: str) -> str:
+    """
+    Parse id_token from modeus server.
+
+    Parameters:
+    email (str): email.
+    password (str): password.
+
+    Returns:
+    str: id_token.
+
+    Raises:
+    RuntimeError: if can't parse 1st form, 2nd form or id_token.
+    """
+    with ModeusClient() as client:
+        return client.login(email, password)
 
 def modeus_auth(email: str, password: str) -> bool:
     """
@@ -80,47 +661,10 @@ def modeus_auth(email: str, password: str) -> bool:
     bool: True if credentials are correct, False otherwise.
 
     Raises:
-    RuntimeError: if can't parse 1st form, 2nd form.
+    RuntimeError: if can't parse 1st form.
     """
-        # copy-paste from modeus_parse_token until can't parse 2nd form. If parsed, return True
-    with httpx.Client(timeout=10) as client:
-        params = {
-            "client_id":"YDNCeCPsf1zL2etGQflijyfzo88a",
-            "redirect_uri":"https://narfu.modeus.org/",
-            "response_type":"id_token",
-            "scope":"openid",
-            "state":"abab35fcb9164912aa46d287a594a338",
-            "nonce":"08cd3a21e9724040acb48cf3a35b0c4b"
-        }
-        url = "https://narfu-auth.modeus.org/oauth2/authorize"
-        before_form1_response = client.get(url, params=params)
-        cookies = httpx.Cookies()
-        cookies.set(
-            'tc01', before_form1_response.cookies['tc01']
-        )
-        form1_response = client.get(
-            before_form1_response.next_request.url,
-            cookies=cookies
-        )
-        form1 = form1_response.text
-        form1_url_match = re.search(r'<form.*action="(https:.+)".*>', form1)
-        if not form1_url_match:
-            raise RuntimeError("modeus_auth: can't parse 1st form")
-        form1_url = form1_url_match.group(1)
-        data = {
-            "UserName":email,
-            "Password":password,
-            "AuthMethod":"FormsAuthentication"
-        }
-        form2_response = client.post(
-            form1_url, data=data, cookies=httpx.Cookies(), follow_redirects=True,
-            headers=dict(Referer=str(form1_response.url))
-        )
-        form2 = form2_response.text
-        form2_matches = re.findall(r'<input type="hidden" name="(.+?)" value="(.+?)" \/>', form2)
-        if len(form2_matches) < 2:
-            return False
-        return True
+    with ModeusClient() as client:
+        return client.check_credentials(email, password)
 
 
 def get_schedule(person_id: str, modeus_token: str, start_time: datetime, end_time: datetime) -> dict:
@@ -140,103 +684,28 @@ def get_schedule(person_id: str, modeus_token: str, start_time: datetime, end_ti
     ValueError: if start_time >= end_time.
     RuntimeError: if can't find key embedded.
     """
-    if end_time<=start_time:
-        raise ValueError("End time must be greater than start time!")
-    url = "https://narfu.modeus.org/schedule-calendar-v2/api/calendar/events/search?tz=Europe/Moscow"
-    # "/" must not be encoded
-    request_json = {
-        "size": 500,
-        "timeMin": start_time.astimezone(UTC).isoformat(timespec='seconds'),
-        "timeMax": end_time.astimezone(UTC).isoformat(timespec='seconds'),
-        "attendeePersonId": [person_id,]
-    }
-
-    headers = {
-        "Content-type": "application/json",
-        "Authorization": f"Bearer {modeus_token}"
-    }
+    with ModeusClient(modeus_token) as client:
+        return client.get_schedule(person_id, start_time, end_time)
 
-    with httpx.Client(timeout=10) as client:
-        response = client.post(
-            url,
-            json=request_json,
-            headers=headers
-        )
-        j=response.json()
-        #with open("tt.json", "w", encoding="UTF-8") as f: json.dump(j["_embedded"], f, ensure_ascii=False, indent=2)
-        if "_embedded" in j: return j
-        else: raise RuntimeError("No key embedded")
-
-def get_schedule_async(person_id: str, modeus_token: str, start_time: datetime, end_time: datetime, on_finish, stop_event: asyncio.Event) -> None:
+async def get_schedule_async(person_id: str, modeus_token: str, start_time: datetime, end_time: datetime) -> dict:
     """
-    Get schedule of a person asynchronously.
+    Get schedule of a person asynchronously. Await it, or use AsyncModeusClient if you make many calls.
 
     Parameters:
     person_id (str): person id.
     modeus_token (str): modeus token.
     start_time (datetime): start time.
     end_time (datetime): end time.
-    on_finish (function): callback function.
-    stop_event (asyncio.Event): stop event.
 
     Returns:
-    None.
+    dict: huge json with schedule.
 
     Raises:
     ValueError: if start_time >= end_time.
+    RuntimeError: if can't find key embedded.
     """
-    if end_time<=start_time:
-        raise ValueError("End time must be greater than start time!")
-    url = "https://narfu.modeus.org/schedule-calendar-v2/api/calendar/events/search?tz=Europe/Moscow"
-    # "/" must not be encoded
-    request_json = {
-        "size": 500,
-        "timeMin": start_time.astimezone(UTC).isoformat(timespec='seconds'),
-        "timeMax": end_time.astimezone(UTC).isoformat(timespec='seconds'),
-        "attendeePersonId": [person_id,]
-    }
-
-    headers = {
-        "Content-type": "application/json",
-        "Authorization": f"Bearer {modeus_token}"
-    }
-
-    async def get_schedule_async_inner():
-        async with httpx.AsyncClient(timeout=10) as client:
-            try:
-                while not stop_event.is_set():
-                    response_task = asyncio.create_task(client.post(
-                        url,
-                        json=request_json,
-                        headers=headers
-                    ))
-                    done, pending = await asyncio.wait(
-                        [response_task],
-                        timeout=1,
-                        return_when=asyncio.FIRST_COMPLETED
-                    )
-
-                    if stop_event.is_set():
-                        for task in pending:
-                            task.cancel()
-                        break
-
-                    if response_task in done:
-                        response = response_task.result()
-                        response.raise_for_status()
-                        j = response.json()
-                        on_finish(j)
-                        break  # Exit the loop after the first successful request
-            except httpx.RequestError as exc:
-                print(f"An error occurred while requesting {exc.request.url!r}.")
-            except httpx.HTTPStatusError as exc:
-                print(f"Error response {exc.response.status_code} while requesting {exc.request.url!r}.")
-            except asyncio.CancelledError:
-                print("The task was cancelled.")
-    #asyncio.create_task(get_schedule_async_inner())  # this gives no event loop error
-    async def run():
-        task = asyncio.create_task(get_schedule_async_inner())
-    asyncio.run(run())
+    async with AsyncModeusClient(modeus_token) as client:
+        return await client.get_schedule(person_id, start_time, end_time)
 
 def search_person(term: str, by_id: bool, modeus_token: str) -> dict:
     """
@@ -253,32 +722,8 @@ def search_person(term: str, by_id: bool, modeus_token: str) -> dict:
     Raises:
     RuntimeError: if can't find key embedded.
     """
-    if by_id:
-        logging.warning("Search by id is not implemented yet. Returning empty result.")
-        return {"_embedded": {"persons": []}}
-    mode="id" if by_id else "fullName"
-    request_json = {
-        "size": 10,
-        mode: term,
-        "sort": "+fullName"
-    }
-
-    headers = {
-        "Content-type": "application/json",
-        "Authorization": f"Bearer {modeus_token}"
-    }
-
-    url="https://narfu.modeus.org/schedule-calendar-v2/api/people/persons/search"
-    with httpx.Client(timeout=10) as client:
-        response = client.post(
-            url,
-            json=request_json,
-            headers=headers
-        )
-    
-        j=response.json()
-        if "_embedded" in j: return j
-        else: raise RuntimeError(f"No key embedded! {j}")
+    with ModeusClient(modeus_token) as client:
+        return client.search_person(term, by_id)
 
 def who_goes(event_id: str, modeus_token: str) -> dict:
     """
@@ -290,56 +735,6 @@ def who_goes(event_id: str, modeus_token: str) -> dict:
 
     Returns:
     dict: huge json with attendees.
-
-    Raises:
-    RuntimeError: if can't find key embedded.
     """
-    headers = {
-        "Content-type": "application/json",
-        "Authorization": f"Bearer {modeus_token}"
-    }
-
-    url=f"https://narfu.modeus.org/schedule-calendar-v2/api/calendar/events/{event_id}/attendees"
-    with httpx.Client(timeout=10) as client:
-        response = client.get(
-            url,
-            headers=headers
-        )
-    
-        j=response.json()
-        return j
-class TimeCache:
-    def __init__(self, seconds=5):
-        self.ttl = 0
-        self.seconds = seconds
-        self.cache = {}
-
-    @property
-    def expired(self):
-        """Return the same value withing `seconds` time period"""
-        ttl=round(time.time() / self.seconds)
-        if ttl != self.ttl:
-            self.ttl = ttl
-            self.cache = {}
-            return True
-        return False  # not expired
-
-    def __call__(self, func):
-        def wrapper(*args, **kwargs):
-            key = (args, frozenset(kwargs.items()))
-            if not self.expired and key in self.cache:
-                return self.cache[key][1]
-            result = func(*args, **kwargs)
-            self.cache[key] = (self.ttl, result)
-            return result
-        return wrapper
-
-# a function that returns if there is internet connection. It caches for 5 seconds
-@TimeCache(5)
-def is_connected():
-    try:
-        httpx.get("https://google.com", timeout=5)
-        return True
-    except:
-        return False
-
+    with ModeusClient(modeus_token) as client:
+        return client.who_goes(event_id)
@@ -1,6 +1,8 @@
 from datetime import datetime, timedelta, date #, time
 from dateutil.relativedelta import relativedelta
 from asyncio import Event as AEvent  # we already have an Event class
+import asyncio
+from threading import Thread
 import json
 import os
 from .modeus import modeus_parse_token, get_schedule, get_schedule_async, search_person, who_goes, modeus_auth
@@ -156,9 +158,16 @@ class Schedule:
         else:
             end_time=moscow.localize(datetime.combine(end_time, datetime.min.time()))+timedelta(days=1, seconds=-1)
         if on_finish is not None:
-            cb=lambda x: on_finish(Events.from_big_mess(x))
             self.schedstop.clear()
-            get_schedule_async(person.person_id, self.token, start_time, end_time, cb, self.schedstop)
+            def fetch():  # get_schedule_async is a coroutine now, so it runs in its own loop in a thread
+                try:
+                    mess=asyncio.run(get_schedule_async(person.person_id, self.token, start_time, end_time))
+                except Exception as e:
+                    print(f"An error occurred while getting the schedule: {e!r}")
+                    return
+                if not self.schedstop.is_set():
+                    on_finish(Events.from_big_mess(mess))
+            Thread(target=fetch, daemon=True).start()
             return Events([])
         try:
             g=Events.from_big_mess(get_schedule(person.person_id, self.token, start_time, end_time))
@@ -180,7 +189,7 @@ class Schedule:
         person (Person): the person to get schedule. If not given, it will get schedule for self.people.current.
 
         Returns:
-        Events: Events list of diffs for the month.
+        Events: the changes of the month against its cache, with diff marks. Empty on the first fetch of the month, there is nothing to compare with.
         """
         if person==noone:
             person=self.people.current
@@ -192,8 +201,7 @@ class Schedule:
         sched=self.get_schedule(person, start_time, end_time)
         if self.no_internet:  # we dont cache if we don't have internet
             return Events([])
-        diff=sched.to_cache(month, person.person_id)
-        return diff  # if there is no diff, it will return empty Events object
+        return sched.to_cache(month, person.person_id).events()  # to_cache gives a ChangeSet, and an empty Events if nothing changed
 
 
     def search_in_cache(self, person: Person, start_date: date, end_date: date) -> Events:
@@ -214,7 +222,8 @@ class Schedule:
         for month in range(start_date.month, end_date.month+1):
             cache=Events.from_cache(month, person.person_id)
             if cache.nocache:
-                cache=self.get_month(month, person) # yep, go grab that months.
+                self.get_month(month, person) # yep, go grab that months.
+                cache=Events.from_cache(month, person.person_id)  # get_month gives only the changes, the month itself is in the cache now
             events+=cache
         return events.get_events_between_dates(start_date, end_date)
 
@@ -1,29 +1,91 @@
 from datetime import date, time, datetime, timedelta
 from pytz import timezone
 from .russian_date import russian_date
-from dataclasses import dataclass, field
-from copy import deepcopy
+from dataclasses import dataclass, field, replace
+from functools import lru_cache
+from bisect import bisect_left, bisect_right
 try:
     from typing import Self
 except ImportError:
     Self=type("Self", (), {})
 from . import mess, people
+from .search import SearchIndex
+from . import ics
+from .ics import IcsWriter
+from itertools import groupby
+from operator import attrgetter
+import io
 import json
-import icalendar
 
 STUDIES = [time(8, 20), time(10, 10), time(12, 0), time(14, 30), time(16, 15), time(18, 0), time(19, 40)]
 
+_STUDY_NUMBERS = {study: number for number, study in enumerate(STUDIES, 1)}
+
 def study_to_number(study_time: time) -> int:
     """Converts the study time to the number of the event. Returns -1 if the time is not a study time, which happened only once in the developer's life."""
-    return STUDIES.index(study_time)+1 if study_time in STUDIES else -1
+    return _STUDY_NUMBERS.get(study_time, -1)
+
+# a semester has only a few hundred distinct timestamps, and each of them repeats in many events, so every string is parsed once.
+# dates and times are immutable, sharing them between events is safe.
+@lru_cache(maxsize=4096)
+def _parse_moment(stamp: str) -> tuple[date, time]:
+    moment = datetime.fromisoformat(stamp)
+    return moment.date(), moment.time()
+
+_parse_date = lru_cache(maxsize=4096)(date.fromisoformat)
+_parse_time = lru_cache(maxsize=1024)(time.fromisoformat)
 
 moscow=timezone("Europe/Moscow")
 
+@lru_cache(maxsize=8192)  # pytz localize is slow, and sorting calls it on every comparison. The same few hundred moments come again and again
 def combine_moscow(date, time):  # i am from russia, we are lazy to write this every time xD!
     return moscow.localize(datetime.combine(date, time))
 
-@dataclass
-class Event:
+# the text of an event doesn't have its date, so the same class every week at the same time is rendered once.
+# keyed by the values, not by the event, so changing an event can't give an old text
+@lru_cache(maxsize=8192)
+def _render_event(event_num: int, event_start: time, event_end: time, format: str, event_name: str, teacher: str, room_name: str, address: str, event_times: bool) -> str:
+    event_num_str=f"Пара {event_num}" if event_num>0 else "Событие"
+    if "online" in address:
+        addrmsg=f"Проходит онлайн:\n{room_name}"
+    elif "online" in room_name:
+        addrmsg=f"Проходит онлайн:\n{address}"
+    else:
+        addrmsg=f"В аудитории: {room_name}. По адресу: {address}."  # if both are not online, then print both
+    evtmsg=f"с {event_start:%H:%M} до {event_end:%H:%M}. " if event_times or event_num<=0 else ""  # if it is not a study event, then even if event_times is False, we will show the times because it's not obvious
+    return f"{event_num_str}: {evtmsg}{format}, {event_name}. Преподаватель {teacher}. {addrmsg}."
+
+@lru_cache(maxsize=4096)
+def _render_double(first_num: int, second_num: int, format: str, event_name: str, teacher: str, room_name: str, address: str) -> str:
+    addrmsg=f"Проходит онлайн:\n{room_name}" if "online" in address else f"В аудитории: {room_name}. По адресу: {address}."  # if both are not online, then print both
+    return f"Двойная пара: пары {first_num} и {second_num}. {format}, {event_name}. Преподаватель {teacher}. {addrmsg}"
+
+@dataclass(slots=True)
+class _EventFields:
+    # the fields of Event. They live in a base class, because dataclass with slots drops a method called __dict__, and Event has one
+    event_id: str
+    event_num: int  # first, second, etc.
+    event_date: date
+    event_start: time
+    event_end: time
+    event_name: str
+    teacher: str
+    room_name: str
+    address: str
+    status: str
+    format: str=""
+    diff: int=0  # 0- no diff, 1- new, -1- removed, 2- changed
+    changed: list=field(default_factory=list)  # list of changed fields
+    # aware start and end, computed once. combine_moscow is memoized, so events at the same time share them
+    _start: datetime=field(init=False, repr=False, compare=False)
+    _end: datetime=field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        self._start=combine_moscow(self.event_date, self.event_start)
+        self._end=combine_moscow(self.event_date, self.event_end)
+
+
+class Event(_EventFields):
     """
     Represents a single event in the schedule.
 
@@ -42,20 +104,14 @@ class Event:
 
     Optional Attributes:
     - diff (int): The difference between this event and another event.
+
+    Computed Attributes:
+    - start_datetime, end_datetime (datetime): aware start and end in Moscow time. Events are compared and sorted by them.
+    - start_ts, end_ts (int): the same as UTC epoch seconds.
+
+    The event is slotted, and its times are computed once on creation, so don't change the date and the times of an existing event, make a new one.
     """
-    event_id: str
-    event_num: int  # first, second, etc.
-    event_date: date
-    event_start: time
-    event_end: time
-    event_name: str
-    teacher: str
-    room_name: str
-    address: str
-    status: str
-    format: str=""
-    diff: int=0  # 0- no diff, 1- new, -1- removed, 2- changed
-    changed: list=field(default_factory=list)  # list of changed fields
+    __slots__=()
 
     #region magic methods
     def __eq__(self, other):
@@ -66,7 +122,12 @@ class Event:
 
     def prop_eq(self, other):
         """Compares the properties of this event with another event."""
-        return self.event_num==other.event_num and self.event_date==other.event_date and self.event_start==other.event_start and self.event_end==other.event_end and self.event_name==other.event_name and self.teacher==other.teacher and self.room_name==other.room_name and self.address==other.address and self.status==other.status
+        return self.fingerprint==other.fingerprint
+
+    @property
+    def fingerprint(self) -> tuple:
+        """The properties compared by prop_eq, as a hashable tuple. Events with equal fingerprints are the same event, even if modeus gave them different ids."""
+        return (self.event_num, self.event_date, self.event_start, self.event_end, self.event_name, self.teacher, self.room_name, self.address, self.status)
 
     def __str__(self):  # human readable in russian
         return self.humanize()  # i will rewrite humanize method to return the string
@@ -78,16 +139,17 @@ class Event:
 
     def __lt__(self, other):
         # end times will be shifted exactly same as start times, so we can compare only start times
-        return self.start_datetime<other.start_datetime
+        return self._start<other._start
 
     def __gt__(self, other):
-        return self.start_datetime>other.start_datetime
+        return self._start>other._start
     #endregion
 
     def pprint(self) -> str:
         """Prints the event in a human-readable format."""
-        print(self.__str__())
-        return self.__str__()
+        text=self.__str__()
+        print(text)
+        return text
 
 
     @property
@@ -98,7 +160,7 @@ class Event:
         Returns:
         - datetime: The start datetime of the event.
         """
-        return combine_moscow(self.event_date, self.event_start)
+        return self._start
 
     @property
     def end_datetime(self) -> datetime:
@@ -108,7 +170,17 @@ class Event:
         Returns:
         - datetime: The end datetime of the event.
         """
-        return combine_moscow(self.event_date, self.event_end)
+        return self._end
+
+    @property
+    def start_ts(self) -> int:
+        """UTC epoch seconds of the start."""
+        return int(self._start.timestamp())
+
+    @property
+    def end_ts(self) -> int:
+        """UTC epoch seconds of the end."""
+        return int(self._end.timestamp())
 
     def __dict__(self) -> dict:
         """
@@ -156,12 +228,13 @@ class Event:
         else:
             diff=2
             changed=data["diff"].split()
-        edate=date.fromisoformat(data["date"])
-        estime=time.fromisoformat(data["start_time"])
-        eetime=time.fromisoformat(data["end_time"])
+        edate=_parse_date(data["date"])
+        estime=_parse_time(data["start_time"])
+        eetime=_parse_time(data["end_time"])
         # if there is no format, then old cache is used. But soon the app will get new cache with format
         format=data["format"] if "format" in data else ""
-        return cls(data["id"], data["event"], edate, estime, eetime, data["name"], data["teacher"], data["room_name"], data["address"], data["status"], format, diff, changed)
+        intern=mess.intern  # json gives a new string for every occurrence, keep one copy of each
+        return cls(data["id"], data["event"], edate, estime, eetime, intern(data["name"]), intern(data["teacher"]), intern(data["room_name"]), intern(data["address"]), intern(data["status"]), intern(format), diff, changed)
 
     @property
     def diffstr(self) -> str:
@@ -175,41 +248,35 @@ class Event:
         else:
             return ""
 
+    def changed_fields(self, other) -> list[str]:
+        """
+        Names of the fields that differ from the other event, like the keys of the json. The fingerprints are compared first, the fields are looked at only if they differ.
+
+        Parameters:
+        - other (Event): The old version of this event.
+
+        Returns:
+        - list: e.g. ["start_time", "room_name"], empty if nothing changed.
+        """
+        if self.fingerprint==other.fingerprint:
+            return [] if self.format==other.format else ["format"]
+        # we can omit checking the event num, because it dependends on the start time
+        return [key for key, attr in _DIFF_FIELDS if getattr(self, attr)!=getattr(other, attr)]
+
     def get_diff(self, other) -> Self:
         """
-        Returns the difference between this event and another event.
+        Returns the difference between this event and another event. Neither of the events is changed.
 
         Parameters:
         - other (Event): The old event to compare with.
 
         Returns:
-        - Event|None: The difference between the two events. e.g. events list with diff marks.
+        - Event|None: None if the ids differ, else a copy of this event marked as changed, or with diff 0 if nothing changed.
         """
         if self.event_id!=other.event_id:
             return None
-        # if ids are equal, then check all fields
-        diff=2
-        if self.event_start != other.event_start:  # we can omit checking the event num, because it dependends on the start time
-            self.changed.append("start_time")  # append like json key.
-        if self.event_end != other.event_end:
-            self.changed.append("end_time")
-        if self.event_date!=other.event_date:
-            self.changed.append("date")
-        if self.event_name!=other.event_name:
-            self.changed.append("name")
-        if self.teacher!=other.teacher:
-            self.changed.append("teacher")
-        if self.room_name!=other.room_name:
-            self.changed.append("room_name")
-        if self.address!=other.address:
-            self.changed.append("address")
-        if self.status!=other.status:
-            self.changed.append("status")
-        if self.format!=other.format:
-            self.changed.append("format")
-        if len(self.changed)==0:
-            diff=0
-        return Event(self.event_id, self.event_num, self.event_date, self.event_start, self.event_end, self.event_name, self.teacher, self.room_name, self.address, self.status, diff, self.changed)
+        changed=self.changed_fields(other)
+        return replace(self, diff=2 if changed else 0, changed=changed)
 
     def human_diff(self) -> str:
         """Returns the diff as a human-readable string."""
@@ -250,15 +317,7 @@ class Event:
         Parameters:
         - event_times (bool): Whether to include the event times in the string.
         """
-        event_num_str=f"Пара {self.event_num}" if self.event_num>0 else "Событие"
-        if "online" in self.address:
-            addrmsg=f"Проходит онлайн:\n{self.room_name}"
-        elif "online" in self.room_name:
-            addrmsg=f"Проходит онлайн:\n{self.address}"
-        else:
-            addrmsg=f"В аудитории: {self.room_name}. По адресу: {self.address}."  # if both are not online, then print both
-        evtmsg=f"с {self.event_start:%H:%M} до {self.event_end:%H:%M}. " if event_times or self.event_num<=0 else ""  # if it is not a study event, then even if event_times is False, we will show the times because it's not obvious
-        return f"{event_num_str}: {evtmsg}{self.format}, {self.event_name}. Преподаватель {self.teacher}. {addrmsg}."
+        return _render_event(self.event_num, self.event_start, self.event_end, self.format, self.event_name, self.teacher, self.room_name, self.address, event_times)
 
 
     def __contains__(self, item) -> bool:
@@ -289,11 +348,100 @@ class Event:
         return self
 
 
+def _as_date(value: date) -> date:
+    # datetime is a date too, but it can't be compared with dates
+    return value.date() if isinstance(value, datetime) else value
+
+
+# json keys of the diff and the attributes behind them, in the order they are reported
+_DIFF_FIELDS = (("start_time", "event_start"), ("end_time", "event_end"), ("date", "event_date"), ("name", "event_name"), ("teacher", "teacher"), ("room_name", "room_name"), ("address", "address"), ("status", "status"), ("format", "format"))
+
+
+@dataclass(frozen=True, slots=True)
+class EventChange:
+    """An event that is in both versions of the schedule, but differs."""
+    new: Event
+    old: Event
+    fields: tuple[str, ...]  # json keys of the changed fields, e.g. ("start_time", "room_name")
+
+
+@dataclass(frozen=True, slots=True)
+class ChangeSet:
+    """
+    The difference between two versions of a schedule. It's immutable and doesn't touch the events it came from.
+    Iterating gives copies of the events with diff marks, sorted by start, like the old diff did.
+
+    Attributes:
+    - added (tuple): events that are only in the new schedule.
+    - removed (tuple): events that are only in the old schedule.
+    - changed (tuple): EventChange for every event that is in both, but differs.
+    """
+    added: tuple[Event, ...]=()
+    removed: tuple[Event, ...]=()
+    changed: tuple[EventChange, ...]=()
+
+    def __len__(self):
+        return len(self.added)+len(self.removed)+len(self.changed)
+
+    def __bool__(self):
+        return len(self)>0
+
+    def __iter__(self):
+        return iter(self.events())
+
+    def events(self) -> "Events":
+        """The changes as Events with diff marks, e.g. for the json cache or for human_diff."""
+        marked=[replace(event, diff=1) for event in self.added]
+        marked+=[replace(event, diff=-1) for event in self.removed]
+        marked+=[replace(change.new, diff=2, changed=list(change.fields)) for change in self.changed]
+        return Events(sorted(marked))
+
+    def human_diff(self) -> str:
+        """Returns the diff as a human-readable string."""
+        return self.events().human_diff()
+
+    def pprint_diff(self) -> str:
+        """Prints the diff in a human-readable format if there are."""
+        return self.events().pprint_diff()
+
+
+class _EventList(list):
+    """The list of Events. It counts its changes, so the indexes of Events know when to rebuild, even if the list is changed directly."""
+    version=0  # a class default, unpickling fills the list before any __init__
+
+
+def _counted(name: str):
+    method=getattr(list, name)
+    def counted(self, *args, **kwargs):
+        self.version+=1
+        return method(self, *args, **kwargs)
+    counted.__name__=name
+    return counted
+
+for _name in ("__setitem__", "__delitem__", "__iadd__", "__imul__", "append", "extend", "insert", "pop", "remove", "clear", "sort", "reverse"):
+    setattr(_EventList, _name, _counted(_name))
+
+
 class Events:  # if this were rust, it would be a trait for Vec<Event>
     """A collection of events. Supports all list methods and some additional methods for filtering and diffing."""
     def __init__(self, events: list[Event]=[]):
         self.events=events
-        self.tokens=[]  # for tokenizing the events
+        self.tokens=[]  # for tokenizing the events: (event, offset of its line) of the last humanize
+        self._token_ends=[]  # where those lines end
+        self._index=None  # time index for bisect, see _time_index
+        self._search=None  # word index for queries, see _search_index
+        self.stale=None  # timedelta. If set, the events came from the cache while modeus was unreachable, and the cache is that old
+        self.failed_ranges=[]  # (start, end) of the shards that failed to fetch. Their events are missing
+
+    @property
+    def events(self) -> list[Event]:
+        return self._events
+
+    @events.setter
+    def events(self, events: list[Event]):
+        self._events=events if isinstance(events, _EventList) else _EventList(events)  # a copy, so a list given to us can't change behind our back
+        self._index=None
+        self._search=None
 
     #region magic methods
     def __iter__(self):
@@ -319,7 +467,7 @@ class Events:  # if this were rust, it would be a trait for Vec<Event>
     def __contains__(self, item):
         # filter by query. If string, then return bool whether it is in all event strings
         if isinstance(item, str):  # if "Воронцов" in events, it will return True if it is in any event
-            return any([item in event for event in self.events])
+            return bool(self._search_index().search(item))
         return item in self.events
 
     def __eq__(self, other):
@@ -330,16 +478,20 @@ class Events:  # if this were rust, it would be a trait for Vec<Event>
 
 
     def __add__(self, other):
-        # add but remove duplicates
-        # use prop eq to check duplicates
-        evt_list = self.events.copy()  # deepcopy is not working here
+        # add but remove duplicates. The left events are the newest, e.g. fresh from modeus, so they win:
+        # an event from the right is dropped if the left has its id (an old version of it) or its properties (the same event under another id)
+        ids = {event.event_id for event in self.events}
+        fingerprints = {event.fingerprint for event in self.events}
+        added = []
         for event in other.events:
-            for el in evt_list:
-                if event.prop_eq(el):
-                    break
-            else:
-                evt_list.append(event)
-        return Events(evt_list)
+            fingerprint = event.fingerprint
+            if event.event_id in ids or fingerprint in fingerprints:
+                continue
+            ids.add(event.event_id)
+            fingerprints.add(fingerprint)
+            added.append(event)
+        # both sides are usually sorted already. Timsort finds the two runs and just merges them, that's linear
+        return Events(sorted(self.events+added))
 
 
     def __sub__(self, other):
@@ -352,42 +504,27 @@ class Events:  # if this were rust, it would be a trait for Vec<Event>
 
     def ics(self) -> str:
         """Returns the events as an iCalendar string."""
-        cal=icalendar.Calendar()
-        cal.add('prodid', '-//NARFUSchedule//deniz.r1oaz.ru//')
-        cal.add('version', '2.0')
-        prev_date=date(2020, 1, 1)  # for making alarm yesterday with the whole day
-        for event in self.events:
-            if event.event_date!=prev_date:
-                prev_date=event.event_date
-                day_event=icalendar.Event()
-                day_event.add('uid', f"{event.event_date}-day")
-                whole_day_schedule = self.get_events_by_date(event.event_date).humanize()  # get the whole day schedule
-                day_event.add('summary', f"Расписание на {russian_date(event.event_date)}")
-                day_event.add('description', whole_day_schedule)
-                day_event.add('dtstart', combine_moscow(event.event_date, time(8, 20)))
-                day_event.add('dtend', combine_moscow(event.event_date, time(21, 0)))
-                day_event.add('dtstamp', moscow.localize(datetime.now()))
-                day_alarm=icalendar.Alarm()
-                day_alarm.add('action', 'display')
-                day_alarm.add('description', f'Расписание на завтра:\n{whole_day_schedule}')
-                day_alarm.add('trigger', timedelta(hours=-14, minutes=-20))  # yesterday at 18:00
-                day_event.add_component(day_alarm)
-                cal.add_component(day_event)
-            ical_event=icalendar.Event()
-            ical_event.add('uid', event.event_id)
-            ical_event.add('summary', f"{event.format}, {event.event_name}")
-            ical_event.add('dtstart', event.start_datetime)
-            ical_event.add('dtend', event.end_datetime)
-            ical_event.add('location', f"{event.room_name}, {event.address}")
-            ical_event.add('description', f"Преподаватель: {event.teacher}.")
-            ical_event.add('dtstamp', moscow.localize(datetime.now()))
-            alarm=icalendar.Alarm()
-            alarm.add('action', 'display')
-            alarm.add('description', 'Скоро начнется пара! Подготовьтесь!')
-            alarm.add('trigger', timedelta(minutes=-15))
-            ical_event.add_component(alarm)
-            cal.add_component(ical_event)
-        return cal.to_ical().decode("utf-8")
+        buffer=io.StringIO()
+        self.write_ics(buffer)
+        return buffer.getvalue()
+
+    def write_ics(self, file) -> None:
+        """
+        Writes the events as an iCalendar to a file without building the whole calendar in memory.
+        Every day gets a whole day event with the schedule of the day and an alarm the day before, every event gets an alarm 15 minutes before.
+
+        Parameters:
+        - file: a text file opened with newline="", or anything with write. See ics.IcsWriter.
+        """
+        today=date.today()
+        with IcsWriter(file) as writer:
+            # events are sorted, so the days go one after another and each of them is rendered once, not looked up in the whole list
+            for day, events in groupby(self.events, key=attrgetter("event_date")):
+                events=list(events)
+                text="\n".join(line for _, line in Events(events)._lines(today=today)).strip()
+                writer.day(day, text, combine_moscow(day, ics.DAY_START), combine_moscow(day, ics.DAY_END), f"Расписание на {russian_date(day, today=today)}")
+                for event in events:
+                    writer.event(event)
 
     def tokenize(self) -> list[tuple[Event, int]]:
         """Tokenizes the events for highlighting in the text field."""
@@ -397,8 +534,9 @@ class Events:  # if this were rust, it would be a trait for Vec<Event>
 
     def get_event_by_strindex(self, index: int) -> Event:  # making this for getting event by highliting the event in the text field
         """returns the event by the index of the human-readable string."""
-        evt= [event for event, start in self.tokenize() if start<=index<(start+len(str(event)))]
-        return evt[0] if len(evt)>0 else None
+        tokens=self.tokenize()
+        i=bisect_right(tokens, index, key=lambda token: token[1])-1  # offsets grow, so the line that starts before the index is the only candidate
+        return tokens[i][0] if i>=0 and index<self._token_ends[i] else None  # date headers are not events
 
 
     def pprint(self, person: people.Person=people.noone) -> str:
@@ -412,8 +550,9 @@ class Events:  # if this were rust, it would be a trait for Vec<Event>
         - str: The events in a human-readable format.
         """
         print(f"Расписание {person.name}:" if person!=people.noone else "Расписание:")  # great if we would have genitive case for names.
-        print(self.__str__())
-        return self.__str__()
+        text=self.__str__()
+        print(text)
+        return text
 
 
     def json(self) -> str:
@@ -438,19 +577,20 @@ class Events:  # if this were rust, it would be a trait for Vec<Event>
             return cls([])
         parsed_events = []
         events = data['events']
+        index = mess.MessIndex(data)  # one pass over the mess, then every lookup is a dict hit
         for event in events:
             #print(event)
             event_id = event['id']
-            event_name = mess.get_name(event['_links']['course-unit-realization']['href'][1:], data) if 'course-unit-realization' in event['_links'] else event["name"]+", "+event["nameShort"]
-            event_format = mess.get_type_and_format_name(event_id, data)
-            event_start = datetime.fromisoformat(event['start']).time()
-            event_end = datetime.fromisoformat(event['end']).time()
-            event_date = datetime.fromisoformat(event['start']).date()
+            event_name = index.name(event['_links']['course-unit-realization']['href'][1:]) if 'course-unit-realization' in event['_links'] else event["name"]+", "+event["nameShort"]
+            event_format = mess.get_type_and_format_name(event_id, index)
+            event_date, event_start = _parse_moment(event['start'])
+            event_end = _parse_moment(event['end'])[1]
             event_num = study_to_number(event_start)
             event_status = event['holdingStatus']['name']
-            room_name, address = mess.get_room(event_id, data)
-            teacher = mess.get_teacher(event_id, data)
-            parsed_events.append(Event(event_id, event_num, event_date, event_start, event_end, event_name, teacher, room_name, address, event_status, event_format))
+            room_name, address = index.room(event_id)
+            teacher = index.teacher(event_id)
+            # the same names repeat all over the semester, keep one copy of each
+            parsed_events.append(Event(event_id, event_num, event_date, event_start, event_end, mess.intern(event_name), mess.intern(teacher), mess.intern(room_name), mess.intern(address), mess.intern(event_status), mess.intern(event_format)))
         return cls(sorted(parsed_events))
 
     @classmethod
@@ -485,7 +625,7 @@ class Events:  # if this were rust, it would be a trait for Vec<Event>
             return cls([], True)  # we have empty cache
         return cls.from_prepared_json(data)
 
-    def to_cache(self, month: int, person_id: str) -> Self:
+    def to_cache(self, month: int, person_id: str) -> ChangeSet:
         """
         put the events to the cache.
 
@@ -494,7 +634,7 @@ class Events:  # if this were rust, it would be a trait for Vec<Event>
         - person_id (str): The person's id.
 
         Returns:
-        - Events: The collection of events representing difference between the old and new events.
+        - ChangeSet: The difference between the old and new events.
         """
         if month==-1:
             month=date.today().month  # we can save to the current month
@@ -518,6 +658,44 @@ class Events:  # if this were rust, it would be a trait for Vec<Event>
         event=[event for event in self.events if event.event_id==event_id]
         return event[0] if len(event)>0 else None
 
+    def _time_index(self) -> tuple[list[Event], list[datetime], list[date], timedelta]:
+        """
+        The events sorted by start, their starts and dates for bisect, and the longest event. Built on the first query and rebuilt when the list changes.
+        Events are almost always sorted already, and sorting a sorted list is linear.
+        """
+        key=self._events.version  # the list counts its changes, replacing it resets the index
+        if self._index is None or self._index[0]!=key:
+            ordered=sorted(self.events)
+            longest=max((event.end_datetime-event.start_datetime for event in ordered), default=timedelta(0))
+            self._index=(key, ordered, [event.start_datetime for event in ordered], [event.event_date for event in ordered], longest)
+        return self._index[1:]
+
+    def event_at(self, moment: datetime) -> Event|None:
+        """
+        Returns the event that goes at the moment, or None. If several go at once, the one that started first.
+
+        Parameters:
+        - moment (datetime): aware time, e.g. moscow.localize(datetime.now()).
+        """
+        ordered, starts, _, longest=self._time_index()
+        found=None
+        # only the events that started not earlier than the longest event before the moment can still go
+        for i in range(bisect_right(starts, moment)-1, bisect_left(starts, moment-longest)-1, -1):
+            if moment<=ordered[i].end_datetime:
+                found=ordered[i]
+        return found
+
+    def event_after(self, moment: datetime) -> Event|None:
+        """
+        Returns the first event that starts after the moment, or None.
+
+        Parameters:
+        - moment (datetime): aware time.
+        """
+        ordered, starts, _, _=self._time_index()
+        i=bisect_right(starts, moment)
+        return ordered[i] if i<len(ordered) else None
+
     def get_events_by_date(self, date: date) -> Self:
         """
         Returns the events for the given date.
@@ -528,7 +706,7 @@ class Events:  # if this were rust, it would be a trait for Vec<Event>
         Returns:
         - Events: The events for the given date.
         """
-        return Events([event for event in self.events if event.event_date==date])
+        return self.get_events_between_dates(date, date)
 
     def get_events_by_num(self, num):
         """
@@ -553,8 +731,9 @@ class Events:  # if this were rust, it would be a trait for Vec<Event>
         Returns:
         - Events: The events between the given start and end times.
         """
+        # times of the day can't be bisected in a list sorted by date and time, so it's a scan
         if start_time==... and end_time==...:
-            return deepcopy(self) # return a copy of the object
+            return Events(self.events.copy())  # the events themselves are not changed by anything, a new list is enough
         if start_time==...:
             return Events([event for event in self.events if event.event_start<=end_time])
         if end_time==...:
@@ -570,15 +749,12 @@ class Events:  # if this were rust, it would be a trait for Vec<Event>
         - end_date (date): The end date to filter the events by.
 
         Returns:
-        - Events: The events between the given start and end dates.
+        - Events: The events between the given start and end dates, sorted by start.
         """
-        if start_date==... and end_date==...:
-            return deepcopy(self)
-        if start_date==...:
-            return Events([event for event in self.events if event.event_date<=end_date])
-        if end_date==...:
-            return Events([event for event in self.events if start_date<=event.event_date])
-        return Events([event for event in self.events if start_date<=event.event_date<=end_date])
+        ordered, _, dates, _=self._time_index()
+        lo=0 if start_date is ... else bisect_left(dates, _as_date(start_date))
+        hi=len(dates) if end_date is ... else bisect_right(dates, _as_date(end_date))
+        return Events(ordered[lo:hi])  # a slice is a new list, the events themselves are not changed by anything
 
 
     def get_events_by_name(self, name: str) -> Self:
@@ -639,43 +815,70 @@ class Events:  # if this were rust, it would be a trait for Vec<Event>
         Returns:
         - Events: The events that match the given query.
         """
-        return Events([event for event in self.events if query.lower() in str(event).lower()])  # what? was it that easy? I thaught we'd check each field!
+        return self.search(query)
+
+    def _search_index(self) -> SearchIndex:
+        """The word index of the events. Built on the first query and rebuilt when the list changes, like the time index."""
+        key=self._events.version
+        if self._search is None or self._search[0]!=key:
+            self._search=(key, SearchIndex(self.events))
+        return self._search[1]
+
+    def search(self, query: str) -> Self:
+        """
+        Searches the events by words of their name, teacher, room, address, status, format and times. Case and ё don't matter, the beginning of a word is enough.
+
+        Parameters:
+        - query (str): words that all must be found, as beginnings of words. "field:word" looks only in that field, e.g. "препод:иванов ауд:12"
+          (name, teacher, room, address, status, format, time, num or their russian names, see search.FIELDS).
+          8:20 is the same as 08:20, "пара 2" finds the second pairs and "онлайн" the online events, like in the printed schedule.
+
+        Returns:
+        - Events: The matching events in their order.
+        """
+        return Events([self.events[position] for position in self._search_index().search(query)])
 
     def overlap(self, other: Self) -> Self:
         """
-        Returns the overlap between this collection of events and another collection of events.
+        Returns the events of this collection that go at the same time as some event of another collection, including the common ones.
 
         Parameters:
         - other (Events): The other collection of events to compare with.
 
         Returns:
-        - Events: The overlap between the two collections of events.
+        - Events: The events of this collection that overlap the other one by time.
         """
-        return Events([event for event in self.events if event in other.events])
+        from ..intervals import overlaps  # intervals are built on top of Events
+        found={overlap.events[0] for overlap in overlaps((self, other))}
+        return Events([event for event in self.events if event in found])
 
 
-    def diff(self, other: Self) -> Self:
+    def diff(self, other: Self) -> ChangeSet:
         """
         Returns the difference between this collection of events and another collection of events.
+        Old and new are joined by event id in one pass over each, and only the events with different fingerprints are compared field by field. No event is changed.
 
         Parameters:
-        - other (Events): The other collection of events to compare with.
+        - other (Events): The old collection of events to compare with.
 
         Returns:
-        - Events: The difference between the two collections of events with diff marks.
+        - ChangeSet: added, removed and changed events. Iterate it or call its events() to get the events with diff marks.
         """
         if len(other)==0:
-            return Events([])  # well, if there was empty cache, then all events seemed new but they are not
-        added=[event.mark_new() for event in self.events if event not in other.events]
-        removed=[event.mark_removed() for event in other.events if event not in self.events]
+            return ChangeSet()  # well, if there was empty cache, then all events seemed new but they are not
+        old={event.event_id: event for event in other.events}
+        new_ids=set()
+        added=[]
         changed=[]
         for event in self.events:
-            old_event=other.get_event_by_id(event.event_id)
-            if old_event is not None:
-                diff=event.get_diff(old_event)  # automatically marks the diff
-                if diff is not None and diff.diff==2:
-                    changed.append(diff)
-        return Events(sorted(added+removed+changed))  # the < operator overloaded by start time
+            new_ids.add(event.event_id)
+            old_event=old.get(event.event_id)
+            if old_event is None:
+                added.append(event)
+            elif fields:=event.changed_fields(old_event):
+                changed.append(EventChange(event, old_event, tuple(fields)))
+        removed=[event for event in other.events if event.event_id not in new_ids]
+        return ChangeSet(tuple(added), tuple(removed), tuple(changed))
 
     def human_diff(self) -> str:
         """Returns the diff as a human-readable string."""
@@ -689,38 +892,82 @@ class Events:  # if this were rust, it would be a trait for Vec<Event>
             return self.human_diff()
         return "" # to avoid printing "Изменений нет" million times for each event
 
-    def humanize(self, event_times: bool=True) -> Self:
+    def _lines(self, event_times: bool=True, today: date|None=None):
+        """
+        Yields the lines of the human-readable text in one pass: (None, date header) when the day changes and (event, its text) for every event.
+        If the next event is the same class in the same room, both are one line of the first event, "Двойная пара".
+        """
+        today=today or date.today()  # once for all the headers
+        events=self.events
+        prev_date=None
+        i=0
+        while i<len(events):
+            event=events[i]
+            if event.event_date!=prev_date:
+                prev_date=event.event_date
+                yield None, f"{russian_date(prev_date, today=today)}:"
+            # if next event is in the same day but the same room, name and teacher, we can write "2 пары" or even "3 пары"
+            following=events[i+1] if i+1<len(events) else None
+            if following is not None and following.event_date==event.event_date and following.room_name==event.room_name and following.event_name==event.event_name and following.teacher==event.teacher:
+                yield event, _render_double(event.event_num, following.event_num, event.format, event.event_name, event.teacher, event.room_name, event.address)
+                i+=2  # skip the next event because we have already written it
+                continue
+            yield event, event.humanize(event_times)
+            i+=1
+
+    def humanize(self, event_times: bool=True) -> str:
         """
-        Returns the events as a human-readable string.
+        Returns the events as a human-readable string. Fills the tokens with the offsets of the events in it.
 
         Parameters:
         - event_times (bool): Whether to include the event times in the string.
         """
-        if len(self.events)==0:
-            self.tokens=[]
+        tokens=[]
+        ends=[]
+        parts=[]
+        offset=0
+        for event, line in self._lines(event_times):
+            if event is not None:
+                tokens.append((event, offset))
+                ends.append(offset+len(line))
+            parts.append(line)
+            offset+=len(line)+1  # and the newline
+        self.tokens=tokens  # a new list every time, so the tokens always match the last text
+        self._token_ends=ends
+        if not parts:
             return "Пар нет!"
-        msg=""
-        prev_date=date(2020, 1, 1)# to instantly print the first date
-        double_evt=False
-        for i, event in enumerate(self.events):
-            if double_evt:
-                double_evt=False
-                continue
-            if event.event_date!=prev_date:
-                msg+=f"\n{russian_date(event.event_date)}:"
-                prev_date=event.event_date
-            self.tokens.append((event, len(msg)))
-            # if next event is in the same day but the same room, name and teacher, we can write "2 пары" or even "3 пары"
-            if i+1<len(self.events) and self.events[i+1].event_date==event.event_date and self.events[i+1].room_name==event.room_name and self.events[i+1].event_name==event.event_name and self.events[i+1].teacher==event.teacher:
-                #msg+=f"\nДвойная пара: пары {event.event_num} и {self.events[i+1].event_num}. {event.format}, {event.event_name}. Преподаватель {event.teacher}. В аудитории: {event.room_name}. По адресу: {event.address}." still check the onlinity
-                addrmsg=f"Проходит онлайн:\n{event.room_name}" if "online" in event.address else f"В аудитории: {event.room_name}. По адресу: {event.address}."  # if both are not online, then print both
-                msg+=f"\nДвойная пара: пары {event.event_num} и {self.events[i+1].event_num}. {event.format}, {event.event_name}. Преподаватель {event.teacher}. {addrmsg}"
+        return "\n".join(parts).strip()
 
-                double_evt=True  # skip the next event because we have already written it
-                continue
-            msg+=f"\n{event.humanize(event_times)}"
-        return msg.strip()
+    def write(self, file, event_times: bool=True) -> None:
+        """
+        Writes the human-readable text to a file line by line, without building the whole string. Doesn't touch the tokens.
+
+        Parameters:
+        - file: a text file or anything with write, e.g. sys.stdout.
+        - event_times (bool): Whether to include the event times.
+        """
+        if not self.events:
+            file.write("Пар нет!")
+            return
+        first=True
+        for _, line in self._lines(event_times):
+            file.write(line if first else "\n"+line)
+            first=False
+
+    def page(self, page: int, page_size: int=25) -> Self:
+        """
+        Returns one page of the events, e.g. to humanize only what is shown. For a range of days use get_events_between_dates.
 
+        Parameters:
+        - page (int): number of the page from 0.
+        - page_size (int): events on a page.
+
+        Returns:
+        - Events: The events of the page, empty if it's out of range.
+        """
+        if page<0:
+            return Events([])
+        return Events(self.events[page*page_size:(page+1)*page_size])
 
     def humanize_event(self, event_id: str) -> str:
         """
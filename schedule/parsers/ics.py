@@ -0,0 +1,124 @@
+# Streaming iCalendar writer. Every component goes to the file as soon as it's made, so a calendar of any size takes
+# only the memory of one day. The output is the same as the one icalendar made for us: the order of properties, escaping and folding.
+
+from datetime import date, datetime, time, timezone
+
+CRLF = "\r\n"
+PRODID = "-//NARFUSchedule//deniz.r1oaz.ru//"
+DAY_START = time(8, 20)  # the whole day event covers the pairs
+DAY_END = time(21, 0)
+DAY_ALARM = "-PT14H20M"  # the day before at 18:00
+EVENT_ALARM = "-PT15M"
+
+
+def escape(text: str) -> str:
+    """Escapes a TEXT value, RFC 5545 3.3.11."""
+    return (text.replace("\\", "\\\\").replace(";", r"\;").replace(",", r"\,")
+            .replace("\r\n", r"\n").replace("\n", r"\n").replace("\r", r"\n"))
+
+
+def fold(line: str, limit: int = 75) -> str:
+    """Splits a content line into lines shorter than limit octets, RFC 5545 3.1. Characters and escapes like \\, are not split."""
+    data = line.encode()
+    if len(data) < limit:
+        return line  # most of the lines
+    parts = []
+    start = 0
+    while len(data) - start >= limit:  # cut by bytes, not char by char, a day description is a few kilobytes
+        cut = start + limit - 1
+        while data[cut] & 0xC0 == 0x80:  # the middle of a character
+            cut -= 1
+        if cut - start > 1 and data[cut - 1] in b"\\^":
+            cut -= 1
+        parts.append(data[start:cut].decode())
+        start = cut
+    parts.append(data[start:].decode())
+    return (CRLF + " ").join(parts)
+
+
+def moment(value: datetime) -> str:
+    """DTSTART and DTEND of an aware pytz datetime: local time with the name of its zone."""
+    return f";TZID={value.tzinfo.zone}:{value:%Y%m%dT%H%M%S}"
+
+
+class IcsWriter:
+    """
+    Writes a calendar of the schedule to a text file component by component.
+    Give a file opened with newline="", the lines end with CRLF already. For a socket use sock.makefile("w", encoding="utf-8", newline="").
+
+    Events.write_ics drives it, e.g.:
+    with open("schedule.ics", "w", encoding="utf-8", newline="") as f:
+        events.write_ics(f)
+    """
+    def __init__(self, file, prodid: str = PRODID):
+        """
+        Parameters:
+        - file: a text file or anything with write.
+        - prodid (str): PRODID of the calendar.
+        """
+        self.file = file
+        self.prodid = prodid
+        self.stamp = f"{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}"  # one DTSTAMP for the whole export
+
+    def _write(self, lines: list[str]):
+        self.file.write(CRLF.join(fold(line) for line in lines) + CRLF)
+
+    def begin(self):
+        self._write(["BEGIN:VCALENDAR", "VERSION:2.0", f"PRODID:{escape(self.prodid)}"])
+
+    def end(self):
+        self._write(["END:VCALENDAR"])
+
+    def __enter__(self):
+        self.begin()
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:  # a broken calendar is better left without the end
+            self.end()
+
+    def day(self, day: date, text: str, start: datetime, end: datetime, title: str):
+        """
+        Writes the whole day event with the schedule of the day and an alarm the day before.
+
+        Parameters:
+        - day (date): the day.
+        - text (str): the schedule of the day.
+        - start, end (datetime): aware times the day event takes.
+        - title (str): the summary, e.g. "Расписание на понедельник, 1 сентября".
+        """
+        text = escape(text)
+        self._write([
+            "BEGIN:VEVENT",
+            f"SUMMARY:{escape(title)}",
+            f"DTSTART{moment(start)}",
+            f"DTEND{moment(end)}",
+            f"DTSTAMP:{self.stamp}",
+            f"UID:{day.isoformat()}-day",
+            f"DESCRIPTION:{text}",
+            "BEGIN:VALARM",
+            "ACTION:display",
+            rf"DESCRIPTION:Расписание на завтра:\n{text}",
+            f"TRIGGER:{DAY_ALARM}",
+            "END:VALARM",
+            "END:VEVENT",
+        ])
+
+    def event(self, event):
+        """Writes an event with an alarm 15 minutes before it."""
+        self._write([
+            "BEGIN:VEVENT",
+            f"SUMMARY:{escape(f'{event.format}, {event.event_name}')}",
+            f"DTSTART{moment(event.start_datetime)}",
+            f"DTEND{moment(event.end_datetime)}",
+            f"DTSTAMP:{self.stamp}",
+            f"UID:{escape(event.event_id)}",
+            f"DESCRIPTION:{escape(f'Преподаватель: {event.teacher}.')}",
+            f"LOCATION:{escape(f'{event.room_name}, {event.address}')}",
+            "BEGIN:VALARM",
+            "ACTION:display",
+            "DESCRIPTION:Скоро начнется пара! Подготовьтесь!",
+            f"TRIGGER:{EVENT_ALARM}",
+            "END:VALARM",
+            "END:VEVENT",
+        ])
@@ -1,21 +1,123 @@
+import sys
+
+
+def intern(value):
+    """
+    Returns the one shared copy of a string, so the same teacher, room or course name repeated in thousands of events is kept in memory once.
+    Equal interned strings are the same object, so comparing them is cheap too. None and other values are returned as is.
+    """
+    return sys.intern(value) if type(value) is str else value
+
+
+class MessIndex:
+    """
+    Indexes of the big mess by id and by eventId, built in one pass over _embedded.
+    Looking things up by scanning the lists for every event makes parsing quadratic, so all the resolvers below go through this.
+    The first item wins if an id repeats, like it was with the scans.
+    """
+    def __init__(self, data: dict):
+        """
+        Parameters:
+        - data (dict): the data from the server, with or without _embedded.
+        """
+        if "_embedded" in data:
+            data = data["_embedded"]
+        self.course_names = {}
+        for cur in data.get('course-unit-realizations', []):
+            self.course_names.setdefault(cur['id'], cur['name'])
+        self.organizers = {}  # eventId -> organizer
+        for organizer in data.get('event-organizers', []):
+            self.organizers.setdefault(organizer['eventId'], organizer)
+        self.attendees = _by_id(data.get('event-attendees', []))
+        self.persons = _by_id(data.get('persons', []))
+        self.locations = {}  # eventId -> all its locations, in order
+        for event_location in data.get('event-locations', []):
+            self.locations.setdefault(event_location['eventId'], []).append(event_location)
+        self.event_rooms = _by_id(data.get('event-rooms', []))
+        self.rooms = _by_id(data.get('rooms', []))
+        self.events = _by_id(data.get('events', []))
+        # the persons search has students and employees instead of events. None if the list is not in the data at all
+        self.students = _by_key(data['students'], 'personId') if 'students' in data else None
+        self.employees = _by_key(data['employees'], 'personId') if 'employees' in data else None
+
+    def name(self, cur_id):
+        return self.course_names.get(cur_id)
+
+    def teacher(self, event_id):
+        organizer = self.organizers.get(event_id)
+        event_attendeer_id = None
+        if organizer is not None:
+            try:
+                event_attendeer_id = organizer['_links']['event-attendees']['href'][1:]
+            except TypeError:
+                return "Неизвестный"
+        assert event_attendeer_id
+        event_attendeer = self.attendees.get(event_attendeer_id)
+        person = self.persons.get(event_attendeer['_links']['person']['href'][1:]) if event_attendeer is not None else None
+        return person['fullName'] if person is not None else None
+
+    def room(self, event_id):
+        for event_location in self.locations.get(event_id, []):
+            # event locations thing has custom location if it's not a room but online event
+            if "customLocation" in event_location and event_location["customLocation"]:  # we check because this strange api can return "customLocation"less event
+                return (event_location["customLocation"], "online")
+            if 'event-rooms' not in event_location['_links']:
+                return (None, None)
+            event_room = self.event_rooms.get(event_location['_links']['event-rooms']['href'][1:])
+            if event_room is None:
+                continue
+            room = self.rooms.get(event_room['_links']['room']['href'][1:])
+            if room is not None:
+                address = room['building']['address'].replace("обл. Архангельская, г. Архангельск, ", "")  # we all know that safu is in arkhangel'sk xD
+                return (room['name'], address)
+
+    def type_id(self, event_id):
+        event = self.events.get(event_id)
+        return event['typeId'] if event is not None else None
+
+    def format_id(self, event_id):
+        event = self.events.get(event_id)
+        return event['formatId'] if event is not None else None
+
+    def person_info(self, person_id):
+        if self.students is not None:
+            if person_id in self.students:
+                return "student", self.students[person_id]
+            if self.employees is None:
+                raise ValueError("Json is strange! If you put in the person id right from this json, than json is terribly wrong or corrupted.")  # either students or employees must be in the json
+        if self.employees is not None:
+            if person_id in self.employees:
+                return "employee", self.employees[person_id]
+            if self.students is None:
+                raise ValueError("Json is strange! If you put in the person id right from this json, than json is terribly wrong or corrupted.")
+        return None, None  # incorrect id
+
+
+def _by_key(items: list, key: str) -> dict:
+    index = {}
+    for item in items:
+        index.setdefault(item[key], item)
+    return index
+
+def _by_id(items: list) -> dict:
+    return _by_key(items, 'id')
+
+def _index(data) -> MessIndex:
+    """Lets the functions below take the raw data or an index that is already built. Build the index once if you resolve many events."""
+    return data if isinstance(data, MessIndex) else MessIndex(data)
+
 def get_name(event_id, data):
     """
     Retrieves the name of an event based on its ID from the given data.
 
     Parameters:
     - event_id (int): The ID of the event to retrieve the name for.
-    - data (dict): The data containing the course unit realizations.
+    - data (dict|MessIndex): The data containing the course unit realizations.
 
     Returns:
     - str or None: The name of the event if found, None otherwise.
     """
-    course_unit_realizations = data['course-unit-realizations']
-    name = None
-    for cur in course_unit_realizations:
-        if cur['id'] == event_id:
-            name = cur['name']
-            break
-    return name
+    return _index(data).name(event_id)
 
 def get_teacher(event_id, data):
     """
@@ -23,57 +125,40 @@ def get_teacher(event_id, data):
 
     Parameters:
     - event_id (int): The ID of the event to retrieve the teacher for.
-    - data (dict): The data from the server.
+    - data (dict|MessIndex): The data from the server.
 
     Returns:
     - str or None: The name of the teacher if found, None otherwise.
     """
-    # works with the big mess
-    event_attendees = data['event-attendees']
-    event_organizers = data['event-organizers']
-    persons = data['persons']
-    event_attendeer_id = None
-    for organizer in event_organizers:
-        if organizer['eventId'] == event_id:
-            try:
-                event_attendeer_id = organizer['_links']['event-attendees']['href'][1:]
-            except TypeError:
-                return "Неизвестный"
-            break
-    assert event_attendeer_id
-    person_id = None
-    for event_attendeer in event_attendees:
-        if event_attendeer['id'] == event_attendeer_id:
-            person_id = event_attendeer['_links']['person']['href'][1:]
-            break
-    for person in persons:
-        if person['id'] == person_id:
-            full_name = person['fullName']
-            return full_name
+    return _index(data).teacher(event_id)
 
 def get_room(event_id, data):
-    # internal. works with the big mess
-    event_locations = data['event-locations']
-    event_rooms = data['event-rooms']	
-    rooms = data['rooms']
-    for event_location in event_locations:
-        if event_location['eventId'] == event_id:
-            # event locations thing has custom location if it's not a room but online event
-            if "customLocation" in event_location and event_location["customLocation"]:  # we check because this strange api can return "customLocation"less event
-                return (event_location["customLocation"], "online")
-            if 'event-rooms' not in event_location['_links']:
-                #print("no room")
-                return (None, None)
+    # internal. works with the big mess or its index
+    return _index(data).room(event_id)
 
-            event_room_id = event_location['_links']['event-rooms']['href'][1:]
-            for event_room in event_rooms:
-                if event_room['id'] == event_room_id:
-                    room_href = event_room['_links']['room']['href']
-                    for room in rooms:
-                        if room['id'] == room_href[1:]:
-                            room_name = room['name']
-                            address = room['building']['address'].replace("обл. Архангельская, г. Архангельск, ", "")  # we all know that safu is in arkhangel'sk xD
-                            return (room_name, address)
+def get_attendance(data):
+    """
+    Finds out which events every person attends. Used to split a response fetched for several people at once.
+
+    Parameters:
+    - data (dict): The data from the server.
+
+    Returns:
+    - dict: person id -> set of event ids. People that are not mentioned in the attendees are not in the dict.
+    """
+    attendance = {}
+    for event_attendee in data.get('event-attendees', []):
+        links = event_attendee.get('_links') or {}
+        if 'person' not in links:
+            continue
+        person_id = links['person']['href'][1:]
+        event_id = event_attendee.get('eventId')
+        if event_id is None and 'event' in links:
+            event_id = links['event']['href'][1:]
+        if event_id is None:
+            continue
+        attendance.setdefault(person_id, set()).add(event_id)
+    return attendance
 
 def get_person_info(person_id, data):
     """
@@ -81,26 +166,13 @@ def get_person_info(person_id, data):
 
     Parameters:
     - person_id (int): The ID of the person to retrieve the information for.
-    - data (dict): The data containing the people information (returned by the server).
+    - data (dict|MessIndex): The data containing the people information (returned by the server).
 
     Returns:
     - tuple: The type of the person and their information.
     """
     # big mess to person's info
-    if "students" in data:
-        person=[per for per in data["students"] if person_id==per["personId"]]  # get the person by id from the students
-        if len(person)==0 and "employees" not in data:
-            raise ValueError("Json is strange! If you put in the person id right from this json, than json is terribly wrong or corrupted.")  # either students or employees must be in the json
-        if len(person)>0:
-            return "student", person[0]
-        # if len(person)==0, then we need to check the employees
-    if "employees" in data:  # further a student can't pass here
-        person=[per for per in data["employees"] if person_id==per["personId"]]
-        if len(person)==0 and "students" not in data:
-            raise ValueError("Json is strange! If you put in the person id right from this json, than json is terribly wrong or corrupted.")
-        if len(person)>0:
-            return "employee", person[0]  # both can't pass further
-    return None, None  # incorrect id
+    return _index(data).person_info(person_id)
 
 
 def get_format_id(event_id, data):
@@ -109,17 +181,12 @@ def get_format_id(event_id, data):
 
     Parameters:
     - event_id (int): The ID of the event to retrieve the format for.
-    - data (dict): The data containing the event formats.
+    - data (dict|MessIndex): The data containing the event formats.
 
     Returns:
     - str or None: The format of the event if found, None otherwise.
     """
-    # data["events"][indx][]
-    events = data['events']
-    for event in events:
-        if event['id'] == event_id:
-            return event['formatId']
-    return None
+    return _index(data).format_id(event_id)
 
 types_formats={
     "LECT": "Лекция",
@@ -143,17 +210,12 @@ def get_type_id(event_id, data):
 
     Parameters:
     - event_id (int): The ID of the event to retrieve the type for.
-    - data (dict): The data containing the event types.
+    - data (dict|MessIndex): The data containing the event types.
 
     Returns:
     - str or None: The type of the event if found, None otherwise.
     """
-    # data["events"][indx][]
-    events = data['events']
-    for event in events:
-        if event['id'] == event_id:
-            return event['typeId']
-    return None
+    return _index(data).type_id(event_id)
 
 def get_type_and_format_name(event_id, data):
     """
@@ -161,11 +223,12 @@ def get_type_and_format_name(event_id, data):
 
     Parameters:
     - event_id (int): The ID of the event to retrieve the type and format for.
-    - data (dict): The data containing the events.
+    - data (dict|MessIndex): The data containing the events.
 
     Returns:
     - str: The type and format of the event.
     """
+    data = _index(data)
     type_id = get_type_id(event_id, data)
     format_id = get_format_id(event_id, data)
     type_name=""
@@ -6,7 +6,7 @@ try:
 except ImportError:
     Self=type("Self", (), {})
 
-from .mess import get_person_info
+from .mess import MessIndex
 
 
 @dataclass
@@ -229,6 +229,7 @@ class People:
         friend (str): The friend's ID (to specify another person to get his/her data).
         """
         self.people=people
+        self.stale=None  # timedelta. If set, the people came from the cache while modeus was unreachable, and the cache is that old
 
     #region magic methods
     def __iter__(self):
@@ -326,9 +327,10 @@ class People:
         if len(persons)==0:
             return cls([]) # empty, not NoOne
         parsed_persons=[]
+        index=MessIndex(data)  # students and employees by personId, built once for all the persons
         for person in persons:
             person_id=person['id']
-            person_type, person_info=get_person_info(person_id, data)
+            person_type, person_info=index.person_info(person_id)
             if person_type=="student":
                 start_date=datetime.fromisoformat(person_info['learningStartDate']).date() if person_info['learningStartDate'] is not None else None
                 end_date=datetime.fromisoformat(person_info['learningEndDate']).date() if person_info['learningEndDate'] is not None else None
@@ -1,8 +1,9 @@
 # lazy to fix the incorrect date parsing. Lets just not use it for now xD
 
-from datetime import date # where is datedelta? If we add some days to 31th of a month, it should go to the next month
+from datetime import date, timedelta # where is datedelta? If we add some days to 31th of a month, it should go to the next month
 from dateutil.relativedelta import relativedelta
 import re
+from functools import lru_cache
 
 months=['января','февраля','марта','апреля','мая','июня', 'июля','августа','сентября','октября','ноября','декабря']
 weekdays=['понедельник','вторник','среда','четверг','пятница','суббота','воскресенье']
@@ -16,13 +17,18 @@ humanweekday=re.compile(r"(?:следующ|прошл)(?:ый|ая|ое|ие)?\
 # wish we could have a regex creator object e.g.
 # russian=RegexCreator().add_digits(1,2, regex_group=True).add_alnum(negative=True).add_words(months, regex_group=True).add_digits(4,4, regex_group=True).compile()
 
-def russian_date(d, include_year=False):
+def russian_date(d, include_year=False, today=None):
+    # give today when printing many dates at once, asking the clock for every date is slow and can change at midnight in the middle
+    return _russian_date(d, include_year, today or date.today())
+
+@lru_cache(maxsize=1024)  # a semester has a couple hundred days, and they are printed again and again
+def _russian_date(d, include_year, today):
     msg=""
-    if d==date.today():
+    if d==today:
         msg="сегодня, "
-    elif d==date.today()-relativedelta(days=+1):
+    elif d==today-timedelta(days=1):
         msg="вчера, "
-    elif d==date.today()+relativedelta(days=1):
+    elif d==today+timedelta(days=1):
         msg="завтра, "
     #  понедельник, 12 марта 2019 года
     msg+=weekdays[d.weekday()]+", "+str(d.day)+" "+months[d.month-1]
@@ -0,0 +1,133 @@
+# Full-text search over events without rendering them. Every field value is split into words once,
+# and the words point to the events that have them, so a query looks at the matching words only, not at every event.
+
+import re
+from bisect import bisect_left
+from functools import lru_cache
+
+# fields of Event that are searched, with the names a query can filter them by: "teacher:иванов", "аудитория:12"
+FIELDS = {
+    "event_name": ("name", "название", "предмет"),
+    "teacher": ("teacher", "преподаватель", "препод"),
+    "room_name": ("room", "аудитория", "ауд"),
+    "address": ("address", "адрес"),
+    "status": ("status", "статус"),
+    "format": ("format", "формат", "тип"),  # and "онлайн" for online events, like the printed text says
+    "time": ("time", "время"),  # not a field, the start and the end, e.g. "11:40"
+    "event_num": ("num", "номер"),  # "пара 2" like it's printed, or "событие" if it's not a pair
+}
+ALIASES = {alias: name for name, aliases in FIELDS.items() for alias in aliases}
+
+_WORD = re.compile(r"\d{1,2}:\d\d|\w+")  # times are one word, "11:40"
+_SHORT_TIME = re.compile(r"(?<![\d:])(\d):(\d\d)")  # 8:20 is 08:20
+_NUMBER = re.compile(r"\d+")
+_TERM = re.compile(r'(?:(\w+):)?(?:"([^"]*)"|(\S+))')  # word, field:word or field:"a few words"
+
+
+def normalize(text: str) -> str:
+    """Casefolds the text and replaces ё with е, nobody types ё in a search."""
+    return text.casefold().replace("ё", "е")
+
+
+def field_text(event, field: str) -> str:
+    """The text of the field of the event that is indexed."""
+    if field=="time":
+        return f"{event.event_start:%H:%M} {event.event_end:%H:%M}"
+    if field=="event_num":
+        return f"пара {event.event_num}" if event.event_num>0 else "событие"
+    if field=="format" and ("online" in event.address or "online" in event.room_name):
+        return f"{event.format} онлайн"
+    return getattr(event, field)
+
+
+@lru_cache(maxsize=8192)  # teachers, rooms and names repeat in hundreds of events, each value is split once
+def words(text: str) -> tuple[str, ...]:
+    """Splits the text into normalized words."""
+    return tuple(_WORD.findall(_SHORT_TIME.sub(r"0\1:\2", normalize(text or ""))))
+
+
+def parse_query(query: str) -> list[tuple[str|None, str]]:
+    """
+    Splits the query into terms.
+
+    Parameters:
+    - query (str): words separated by spaces. A word with a field name before a colon looks only in that field, quotes keep a few words together.
+      Times are words too, 8:20 is the same as 08:20. "пара 2" is the second pair, "онлайн" finds online events.
+
+    Returns:
+    - list: (field, word) pairs, field is None for the words that look in all the fields.
+    """
+    terms=[]
+    for match in _TERM.finditer(query):
+        alias, quoted, plain=match.groups()
+        field=ALIASES.get(normalize(alias)) if alias is not None else None
+        if alias is not None and field is None:  # not a field, e.g. "11:40", so it's just words
+            terms.extend((None, word) for word in words(match.group(0)))
+            continue
+        terms.extend((field, word) for word in words(quoted if quoted is not None else plain))
+    # "пара 2" or "2 пара" is the number of the pair, not any word starting with 2
+    for i in range(len(terms)-1):
+        (field, word), (next_field, next_word)=terms[i], terms[i+1]
+        if field is None and next_field is None and {word, next_word}&{"пара"} and _NUMBER.fullmatch(next_word if word=="пара" else word):
+            terms[i]=("event_num", word)
+            terms[i+1]=("event_num", next_word)
+    return terms
+
+
+class SearchIndex:
+    """
+    An inverted index of events: every word of every searched field points to the positions of the events that have it.
+    Words of a query are prefixes, "ворон" finds "Воронцов". Words of a query must all be found, each in any field or in its own field.
+    """
+    def __init__(self, events: list):
+        """
+        Parameters:
+        - events (list): the events to index. Positions in the results are positions in this list.
+        """
+        self.size=len(events)
+        self.postings={field: {} for field in FIELDS}  # field -> word -> set of positions
+        for position, event in enumerate(events):
+            for field, postings in self.postings.items():
+                for word in words(field_text(event, field)):
+                    postings.setdefault(word, set()).add(position)
+        self.vocabulary={field: sorted(postings) for field, postings in self.postings.items()}  # sorted words for prefix lookup with bisect
+
+    def _prefix(self, field: str, prefix: str) -> set[int]:
+        vocabulary=self.vocabulary[field]
+        postings=self.postings[field]
+        found=set()
+        i=bisect_left(vocabulary, prefix)
+        while i<len(vocabulary) and vocabulary[i].startswith(prefix):
+            found|=postings[vocabulary[i]]
+            i+=1
+        return found
+
+    def lookup(self, field: str|None, prefix: str) -> set[int]:
+        """Positions of the events that have a word starting with prefix in the field, or in any field if field is None."""
+        if field is not None:
+            return self._prefix(field, prefix)
+        found=set()
+        for name in FIELDS:
+            found|=self._prefix(name, prefix)
+        return found
+
+    def search(self, query: str) -> list[int]:
+        """
+        Finds the events that match every word of the query.
+
+        Parameters:
+        - query (str): see parse_query.
+
+        Returns:
+        - list: sorted positions of the matching events. All of them if the query has no words.
+        """
+        terms=parse_query(query)
+        if not terms:
+            return list(range(self.size))
+        found=None
+        for field, prefix in terms:
+            matches=self.lookup(field, prefix)
+            found=matches if found is None else found&matches
+            if not found:
+                return []
+        return sorted(found)
@@ -0,0 +1,149 @@
+# Incremental decoding of the big mess. The response is read chunk by chunk and only the arrays we need are built,
+# the rest of _embedded is decoded item by item and thrown away right away.
+
+import json
+import sys
+
+# arrays of _embedded that Events.from_big_mess and the pagination need
+EVENT_SECTIONS = frozenset({
+    "events", "course-unit-realizations", "event-organizers", "event-attendees",
+    "persons", "event-locations", "event-rooms", "rooms",
+})
+
+_WHITESPACE = " \t\n\r"
+READ_SIZE = 65536  # tiny chunks are joined before decoding, every failed try decodes the item from its start again
+
+
+def _object(pairs: list) -> dict:
+    # raw_decode remembers keys only inside one item, so the same keys of thousands of items would be thousands of strings
+    return {sys.intern(key): value for key, value in pairs}
+
+
+_DECODER = json.JSONDecoder(object_pairs_hook=_object)
+
+
+class _Reader:
+    """A text buffer over an iterator of chunks. Keeps only the part that is not decoded yet."""
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _more(self, size: int = READ_SIZE) -> bool:
+        """Reads at least size characters, or up to the end. Returns False if there was nothing to read."""
+        if self.eof:
+            return False
+        read = []
+        length = 0
+        for chunk in self.chunks:
+            if isinstance(chunk, bytes):
+                raise TypeError("Give decoded text chunks, e.g. response.iter_text()")
+            read.append(chunk)
+            length += len(chunk)
+            if length >= size:
+                break
+        else:
+            self.eof = True
+        if not length:
+            return False
+        self.buf = self.buf[self.pos:] + "".join(read)  # drop what is already decoded
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Returns the next non-whitespace character without consuming it."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._more():
+                raise ValueError("Unexpected end of json")
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise ValueError(f"Expected {char!r} at {self.pos}, got {self.buf[self.pos]!r}")
+        self.pos += 1
+
+    def value(self, decoder=_DECODER):
+        """Decodes one json value. Waits for more data if the value can be cut in the middle."""
+        self.peek()
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                # at least doubles what is left, so a value much bigger than READ_SIZE is not decoded again for every 64 KB
+                if not self._more(max(READ_SIZE, len(self.buf) - self.pos)):
+                    raise
+                continue
+            # a number or a literal at the very end of the buffer can continue in the next chunk
+            if end == len(self.buf) and not self.eof and self._more():
+                continue
+            self.pos = end
+            return value
+
+    def keys(self):
+        """Iterates over the keys of an object. The value of every key must be consumed by the caller before the next key."""
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            yield key
+            if self.peek() == ",":
+                self.pos += 1
+                continue
+            self.expect("}")
+            return
+
+    def items(self):
+        """Iterates over the items of an array, decoding them one by one."""
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.peek() == ",":
+                self.pos += 1
+                continue
+            self.expect("]")
+            return
+
+    def skip(self):
+        """Consumes a value without keeping it. Arrays are skipped item by item, so they are never whole in memory."""
+        if self.peek() == "[":
+            for _ in self.items():
+                pass
+        else:
+            self.value()
+
+
+def decode_big_mess(chunks, sections=EVENT_SECTIONS) -> dict:
+    """
+    Decodes a response of modeus from text chunks, keeping only the wanted arrays of _embedded.
+    Everything outside _embedded (e.g. the page metadata) is kept as is.
+
+    Parameters:
+    - chunks (iterable): text chunks of the response, e.g. response.iter_text().
+    - sections (set): keys of _embedded to keep.
+
+    Returns:
+    - dict: the response with a trimmed _embedded.
+    """
+    reader = _Reader(chunks)
+    result = {}
+    for key in reader.keys():
+        if key != "_embedded":
+            result[key] = reader.value()
+            continue
+        embedded = result["_embedded"] = {}
+        for section in reader.keys():
+            if section in sections:
+                embedded[section] = list(reader.items())
+            else:
+                reader.skip()
+    return result
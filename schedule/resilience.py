@@ -0,0 +1,214 @@
+# Being polite to modeus: don't flood it, retry what can be retried and stop knocking while it's down.
+# The README warns that flooding can get the account banned, so every request goes through here.
+
+import time
+import random
+import asyncio
+import threading
+import httpx
+from datetime import datetime
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised without calling modeus while the circuit breaker thinks modeus is down."""
+    pass
+
+
+class OfflineError(ConnectionError):
+    """Raised without calling modeus while the last real call showed that there is no network."""
+    pass
+
+
+# errors that mean "modeus can't answer now", as opposed to bugs and bad input
+NETWORK_ERRORS=(CircuitOpenError, OfflineError, httpx.TransportError, httpx.HTTPStatusError)
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter. Allows bursts of capacity requests and rate requests per second on average.
+    It is thread-safe and can be shared by sync and async clients.
+    """
+    def __init__(self, rate: float=5, capacity: int=10):
+        """
+        Parameters:
+        rate (float): how many requests per second are allowed on average.
+        capacity (int): how many requests can go at once after a quiet period.
+        """
+        self.rate=rate
+        self.capacity=capacity
+        self.tokens=float(capacity)
+        self.updated=time.monotonic()
+        self._lock=threading.Lock()
+
+    def _reserve(self) -> float:
+        """Takes a token, maybe in debt. Returns how long the caller has to wait for it."""
+        with self._lock:
+            now=time.monotonic()
+            self.tokens=min(self.capacity, self.tokens+(now-self.updated)*self.rate)
+            self.updated=now
+            self.tokens-=1
+            return 0 if self.tokens>=0 else -self.tokens/self.rate
+
+    def acquire(self):
+        """Blocks until a request is allowed."""
+        wait=self._reserve()
+        if wait>0:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        """Waits until a request is allowed without blocking the event loop."""
+        wait=self._reserve()
+        if wait>0:
+            await asyncio.sleep(wait)
+
+
+class RetryPolicy:
+    """
+    Retries transport errors and 5xx/429 responses with jittered exponential backoff.
+    """
+    RETRY_STATUSES={429, 500, 502, 503, 504}
+
+    def __init__(self, attempts: int=3, base: float=0.5, cap: float=8):
+        """
+        Parameters:
+        attempts (int): how many times a request is tried in total.
+        base (float): backoff of the first retry, in seconds.
+        cap (float): maximal backoff, in seconds.
+        """
+        self.attempts=attempts
+        self.base=base
+        self.cap=cap
+
+    def retryable(self, status_code: int) -> bool:
+        return status_code in self.RETRY_STATUSES
+
+    def delay(self, attempt: int, retry_after: str|None=None) -> float|None:
+        """
+        Returns how long to sleep before the next try, or None if there are no tries left.
+
+        Parameters:
+        attempt (int): number of the failed try, starting from 0.
+        retry_after (str): Retry-After header of the response, if any. It is respected, but not longer than cap.
+        """
+        if attempt+1>=self.attempts:
+            return None
+        if retry_after is not None:
+            try:
+                return min(float(retry_after), self.cap)
+            except ValueError:
+                pass  # it can be a http date, we don't bother
+        return random.uniform(0, min(self.cap, self.base*2**attempt))  # full jitter
+
+
+class CircuitBreaker:
+    """
+    Stops calling modeus after failure_threshold failures in a row. After reset_timeout seconds one trial call is let through.
+    If it succeeds, the circuit is closed again, if not, it stays open for another reset_timeout.
+    """
+    def __init__(self, failure_threshold: int=5, reset_timeout: float=30):
+        """
+        Parameters:
+        failure_threshold (int): failures in a row that open the circuit.
+        reset_timeout (float): how long the circuit stays open before a trial call, in seconds.
+        """
+        self.failure_threshold=failure_threshold
+        self.reset_timeout=reset_timeout
+        self.failures=0
+        self.opened_at=None  # monotonic time when the circuit was opened, None if closed
+        self._trial=False  # a trial call is in flight
+        self._lock=threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """closed, open or half-open."""
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic()-self.opened_at>=self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def before_call(self) -> bool:
+        """
+        Call it before every request.
+
+        Returns:
+        bool: True if this call is the trial call. Give it to release if the call ends without an outcome.
+
+        Raises:
+        CircuitOpenError: if the circuit is open, or half-open and the trial call is already going.
+        """
+        with self._lock:
+            state=self.state
+            if state=="closed":
+                return False
+            if state=="half-open" and not self._trial:
+                self._trial=True
+                return True
+            raise CircuitOpenError(f"Modeus seems to be down after {self.failures} failures in a row, not calling it for a while.")
+
+    def record_success(self):
+        with self._lock:
+            self.failures=0
+            self.opened_at=None
+            self._trial=False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures+=1
+            if self._trial or self.failures>=self.failure_threshold:
+                self.opened_at=time.monotonic()
+            self._trial=False
+
+    def release(self, trial: bool):
+        """
+        Call it when a call ends without an answer or a network failure, e.g. cancelled. A trial call is given back, so the next call can be the trial.
+
+        Parameters:
+        trial (bool): what before_call returned for this call. Other calls don't hold the trial, so they must not give it back.
+        """
+        if not trial:
+            return
+        with self._lock:
+            self._trial=False
+
+
+class Connectivity:
+    """
+    Passive connectivity tracker. It doesn't ping anything, it learns from the outcomes of the real calls to modeus.
+    After a network failure we are offline, and calls are not even tried until probe_interval passes. Then the next real call is the probe.
+    """
+    def __init__(self, probe_interval: float=30):
+        """
+        Parameters:
+        probe_interval (float): how long to stay offline before trying the network again, in seconds.
+        """
+        self.probe_interval=probe_interval
+        self.online=True
+        self.last_success=None  # datetime of the last answer from modeus
+        self.last_failure=None  # datetime of the last network failure
+        self._failed_at=0.0  # monotonic time of the last failure
+        self._lock=threading.Lock()
+
+    def should_try(self) -> bool:
+        """True if we are online or it's time to probe the network again."""
+        with self._lock:
+            return self.online or time.monotonic()-self._failed_at>=self.probe_interval
+
+    def check(self):
+        """
+        Raises:
+        OfflineError: if we are offline and it's not time to probe yet.
+        """
+        if not self.should_try():
+            raise OfflineError(f"No connection to modeus since {self.last_failure:%H:%M:%S}.")
+
+    def record_success(self):
+        with self._lock:
+            self.online=True
+            self.last_success=datetime.now()
+
+    def record_failure(self):
+        with self._lock:
+            self.online=False
+            self.last_failure=datetime.now()
+            self._failed_at=time.monotonic()
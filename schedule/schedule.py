@@ -2,10 +2,18 @@
 # I'm rewriting the 90% of the code because it was a huge mess!
 
 import json
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from datetime import datetime, timedelta, date #, time
-from .modeus import modeus_parse_token, get_schedule, search_person, who_goes, modeus_auth
+from .modeus import ModeusClient, AsyncModeusClient, modeus_auth
 from .parsers.events import Event, Events
+from .parsers.mess import get_attendance
+from .resilience import NETWORK_ERRORS
+from .tokens import TokenStore, jwt_expiry, SingleFlight, AsyncSingleFlight
+from .intervals import FreeSlot, free_slots, Overlap, overlaps, LESSON
 from .parsers.people import Person, People, noone, Employee, NoOne
 
 from pytz import timezone
@@ -16,17 +24,58 @@ class NoCacheError(Exception):
     """Raised when there is no cache for the person or the schedule for the specific date/time is not cached."""
     pass
 
-class Schedule:
-    """The main class for abstracting the modeus api"""
-    def __init__(self, email: str, password: str, cache_folder: str=".cache"):
-        """
-        Initialize the Schedule object with email and password. It will check the token and load it if it's not expired.
+def time_range(start_time: date=None, end_time: date=None) -> tuple[datetime, datetime]:
+    """
+    Converts dates to the moscow datetimes of the beginning of start_time and the end of end_time.
+
+    Parameters:
+    start_time (date): start date. If not given, today.
+    end_time (date): end date. If not given, the end of the start date.
+
+    Returns:
+    tuple: (start datetime, end datetime).
+    """
+    if start_time is None:
+        start_time=moscow.localize(datetime.now()).replace(hour=0, minute=0, second=0, microsecond=0)
+    else:
+        start_time=moscow.localize(datetime.combine(start_time, datetime.min.time()))
+    if end_time is None:
+        end_time=start_time+timedelta(days=1, seconds=-1)  # end of the day
+    else:
+        end_time=moscow.localize(datetime.combine(end_time, datetime.max.time()))
+    return start_time, end_time
+
+def split_range(start_time: datetime, end_time: datetime, shard: str="month") -> list[tuple[datetime, datetime]]:
+    """
+    Plans shards of a long time range. Shards are cut at the midnight of the first day of a month or of a monday, so no event is cut in half.
+
+    Parameters:
+    start_time (datetime): start of the range (aware).
+    end_time (datetime): end of the range (aware).
+    shard (str): "month" or "week".
+
+    Returns:
+    list: (start, end) pairs in chronological order. The end of a shard is one second before the start of the next one.
+    """
+    if shard not in ("month", "week"):
+        raise ValueError(f"Unknown shard {shard}. Use month or week.")
+    shards=[]
+    current=start_time
+    while current<=end_time:
+        day=current.date()
+        if shard=="month":
+            boundary=date(day.year+day.month//12, day.month%12+1, 1)
+        else:
+            boundary=day+timedelta(days=7-day.weekday())
+        next_start=moscow.localize(datetime.combine(boundary, datetime.min.time()))
+        shards.append((current, min(next_start-timedelta(seconds=1), end_time)))
+        current=next_start
+    return shards
 
-        Parameters:
-        email (str): Email for modeus
-        password (str): Password for modeus
-        cache_folder (str): Folder to save the cache. If not given, it will save in .cache folder.
-        """
+
+class _ScheduleBase:
+    """Everything that Schedule and AsyncSchedule share: the cache and the logic that doesn't talk to modeus."""
+    def __init__(self, email: str, password: str, cache_folder: str=".cache", shard: str="month", max_concurrency: int=4):
         self.email=email if "@edu.narfu.ru" in email else email+"@edu.narfu.ru"
         self.password=password
         self.token=...
@@ -36,66 +85,101 @@ class Schedule:
         self.cache_folder=Path(cache_folder)
         self.cache_folder.mkdir(exist_ok=True)
         self.me_id = None
-        
-        self.check_token()
+        self.shard=shard  # long ranges are fetched in shards of a month or a week
+        self.max_concurrency=max_concurrency  # how many shards are fetched at the same time
+        self.token_store=TokenStore(self.cache_folder/"token.json")
+        self.refresh_margin=timedelta(minutes=5)  # refresh the token a bit before it dies, not after
+        self._remembered=None  # person_id -> person of people.json as we wrote it, None until it's read
+        self._people_lock=threading.Lock()  # async searches write people.json from threads
 
     def set_me_id(self, me_id: str):
         self.me_id = me_id
 
-    def check_token(self):
-        """
-        Checks if token is expired or not loaded. If it's expired or not loaded, get a new token. This function is automatically called, but it is a good practice to call it every 12 hours if you're developing a long running server script.
-        The token fetched from modeus very slowly, in a few requests and regex parsing, so it's better to load only on start up.
-
-        Raises:
-        Exception: If the token is not loaded successfully or internet connection is not available.
-        """
-        if datetime.now()>self.expire or self.token is None:  # token expired or not loaded
-            try:
-                self.token=modeus_parse_token(self.email, self.password)
-            except Exception as e:
-                self.token=None
-                raise e
-            self.expire=datetime.now()+timedelta(hours=12)  # modeus token lives for 12 hours and dies!
+    @property
+    def online(self) -> bool:
+        """False if the last calls showed that modeus can't be reached. Nothing is pinged, it's learned from the real calls."""
+        return self.client.connectivity.should_try() and self.client.breaker.state!="open"
 
-    def fetch_schedule(self, person_id: str, start_time: date=None, end_time: date=None) -> Events:
-        """
-        Gets schedule for a person.
-
-        Parameters:
-        person_id (str): ID of the person to get schedule for.
-        start_time (datetime): start time of the schedule. If not given, it will get schedule for today.
-        end_time (datetime): end time of the schedule. If not given, it will get schedule for today.
-
-        Returns:
-        list: Schedule of the person in json format. If async, it will return None quickly and pass the result to on_finish function.
-        """
-        if not person_id:
-            raise ValueError("No person_id to get schedule.")
-        self.check_token()
-        if start_time is None:
-            start_time=moscow.localize(datetime.now()).replace(hour=0, minute=0, second=0, microsecond=0)
-        else:
-            start_time=moscow.localize(datetime.combine(start_time, datetime.min.time()))
-        if end_time is None:
-            end_time=start_time+timedelta(days=1, seconds=-1)  # end of the day
+    def _cache_age(self, name: str) -> timedelta|None:
+        """How old a cache file is, or None if there is no such file."""
+        try:
+            return datetime.now()-datetime.fromtimestamp((self.cache_folder/f"{name}.json").stat().st_mtime)
+        except FileNotFoundError:
+            return None
+
+    def _knows(self, people: People) -> bool:
+        """True if the people cache already has all these people as they are."""
+        remembered=self._remembered
+        # == of students and employees compares all the fields, != only the ids
+        return remembered is not None and all(remembered.get(person.person_id)==person for person in people)
+
+    def _remember_people(self, people: People):
+        """Adds found people to the people cache, so they can be found offline. The file is written only if somebody is new or changed."""
+        if len(people)==0 or self._knows(people):
+            return  # e.g. the same search again
+        with self._people_lock:
+            path=self.cache_folder/"people.json"
+            known={person.person_id: person for person in People.from_cache(path)}
+            if not all(known.get(person.person_id)==person for person in people):
+                known.update((person.person_id, person) for person in people)  # fresh data wins
+                People(list(known.values())).to_cache(path)
+            self._remembered=known
+
+    def _offline_people(self, term: str, by_id: bool, error: Exception) -> People:
+        """Searches the people cache when modeus can't answer. Raises the error if there is no cache."""
+        age=self._cache_age("people")
+        if age is None:
+            raise error
+        cached=People.from_cache(self.cache_folder/"people.json")
+        if by_id:
+            results=People([person for person in cached if person.person_id==term])
         else:
-            end_time=moscow.localize(datetime.combine(end_time, datetime.max.time()))
-        return Events.from_big_mess(get_schedule(person_id, self.token, start_time, end_time))
-
-    def cache_schedule(self, person_id: str, start_time: date=None, end_time: date=None, override: bool=False) -> None:
-        """
-        Caches the schedule for a person.
+            results=cached.get_people_by_name(term)
+        results.stale=age
+        logging.warning(f"Modeus is unavailable ({error}), people are searched in the cache that is {age} old.")
+        return results
 
-        Parameters:
-        person_id (str): ID of the person to cache schedule for.
-        start_time (datetime): start time of the schedule. If not given, it will get schedule for today.
-        end_time (datetime): end time of the schedule. If not given, it will get schedule for today.
-        override (bool): If True, it will override the cache, else it will append to the cache.
-        """
-        if person_id != self.me_id:
+    @property
+    def token_expired(self) -> bool:
+        """True if the token is expired, about to expire or not loaded."""
+        return datetime.now()>self.expire-self.refresh_margin or self.token is None
+
+    @property
+    def token_dead(self) -> bool:
+        """True if the token can't be used anymore. Unlike token_expired, it is False during the refresh margin."""
+        return self.token is None or self.token is ... or datetime.now()>self.expire
+
+    def _restore_token(self):
+        """Picks up the token saved by a previous run, if it is still alive. Call it after the client is created."""
+        stored=self.token_store.load(self.email)
+        if stored is not None:
+            self.token, self.expire = stored
+            self.client.token=self.token
+
+    def _forget_token(self, rejected: str):
+        """Drops the token modeus rejected before its exp, e.g. after a password change or a session reset, so the next check_token logs in."""
+        if self.token!=rejected:
+            return  # somebody has already logged in again
+        logging.warning("Modeus rejected the token before it expired, logging in again.")
+        self.token=None
+        self.client.token=None
+        self.token_store.clear()
+
+    def _set_token(self, token: str):
+        self.token=token
+        # the token knows when it dies. If it doesn't, modeus tokens live for 12 hours.
+        self.expire=jwt_expiry(token) or datetime.now()+timedelta(hours=12)
+        try:
+            self.token_store.save(self.email, token, self.expire)
+        except OSError as e:
+            logging.warning(f"Can't save the token to {self.token_store.path}: {e}")
+
+    def _write_cache(self, person_id: str, events: Events, override: bool):
+        """Merges the fetched events with the cache of the person and writes it. A result with failed shards is not written."""
+        if events.failed_ranges:
+            # the cache is trusted to have everything up to its last event, so a hole in the middle would be served as a complete schedule
+            logging.warning(f"Not caching the schedule of {person_id}: {len(events.failed_ranges)} shards failed.")
             return
-        events = self.fetch_schedule(person_id, start_time, end_time)
         folder=self.cache_folder
         if not override:
             try:
@@ -130,19 +214,311 @@ class Schedule:
         Returns:
         Events: Schedule of the person in json format.
         """
-        if start_time is None:
-            start_time=moscow.localize(datetime.now()).replace(hour=0, minute=0, second=0, microsecond=0)
-        else:
-            start_time=moscow.localize(datetime.combine(start_time, datetime.min.time()))
-        if end_time is None:
-            end_time=start_time+timedelta(days=1, seconds=-1)
-        else:
-            end_time=moscow.localize(datetime.combine(end_time, datetime.max.time()))
+        start_time, end_time = time_range(start_time, end_time)
         # now load the whole schedule
         events = self.load_schedule(person_id)
         # now filter the schedule
         return events.get_events_between_dates(start_time.date(), end_time.date())  # empty list if no events
 
+    def _cached_schedule(self, person_id: str, start_time: date=None, end_time: date=None) -> Events|None:
+        """Returns the cached schedule or None if the cache doesn't cover the requested dates."""
+        try:
+            evts = self.load_timed_schedule(person_id, start_time, end_time)
+        except FileNotFoundError:
+            return None
+        effective_end_time = end_time if end_time is not None else datetime.now().date()
+        # can we check if the cache has all the events we need?
+        if len(evts)==0 or evts[len(evts)-1].event_date < effective_end_time:
+            return None
+        return evts
+
+    def _cached_many(self, person_ids: list[str], start_time: date=None, end_time: date=None) -> tuple[dict[str, Events], list[str]]:
+        """Splits the people into the ones whose schedule is in the cache for the whole range and the ones to fetch."""
+        cached={}
+        missing=[]
+        for person_id in dict.fromkeys(person_ids):
+            evts=self._cached_schedule(person_id, start_time, end_time)
+            if evts is None:
+                missing.append(person_id)
+            else:
+                cached[person_id]=evts
+        return cached, missing
+
+    def _fallback_schedule(self, person_id: str, start_time: date, end_time: date, error: Exception) -> Events:
+        """Answers from the cache, even incomplete, when modeus can't answer. Raises the error if there is no cache at all."""
+        try:
+            evts=self.load_timed_schedule(person_id, start_time, end_time)
+        except FileNotFoundError:
+            raise error
+        evts.stale=self._cache_age(person_id)
+        logging.warning(f"Modeus is unavailable ({error}), the schedule is taken from the cache that is {evts.stale} old and can be incomplete.")
+        return evts
+
+    def _merge_shards(self, shards: list[tuple[datetime, datetime]], results: dict[int, Events], errors: dict[int, Exception]) -> Events:
+        """Glues parsed shards back into one sorted Events. Raises the first error only if every shard failed."""
+        if errors:
+            if not results:
+                raise errors[min(errors)]
+            for i in sorted(errors):
+                logging.warning(f"Failed to fetch the schedule from {shards[i][0]} to {shards[i][1]}: {errors[i]}. Returning partial results.")
+        merged=[]
+        seen=set()
+        for i in sorted(results):  # shards are in chronological order, so the result is sorted too
+            for event in results[i]:
+                if event.event_id not in seen:  # an event on a shard border can come twice
+                    seen.add(event.event_id)
+                    merged.append(event)
+        merged=Events(merged)
+        merged.failed_ranges=[shards[i] for i in sorted(errors)]  # on the result, not on self: concurrent fetches would overwrite each other
+        return merged
+
+    @staticmethod
+    def _split_by_person(data: dict, person_ids: list[str]) -> tuple[dict[str, Events], list[str]]:
+        """
+        Splits a response fetched for several people into one Events per person.
+
+        Returns:
+        tuple: (person id -> Events, ids of people that can't be told apart in this response and must be fetched alone).
+        """
+        events=Events.from_big_mess(data)
+        if len(person_ids)==1:
+            return {person_ids[0]: events}, []
+        attendance=get_attendance(data.get("_embedded", data))
+        result={}
+        unresolved=[]
+        for person_id in person_ids:
+            if person_id not in attendance:
+                unresolved.append(person_id)  # either no events or modeus didn't say who attends. Ask again to be sure.
+                continue
+            ids=attendance[person_id]
+            result[person_id]=Events([event for event in events if event.event_id in ids])
+        return result, unresolved
+
+    #region what is going on now. These work with today's schedule.
+    @staticmethod
+    def _now_event(evts: Events) -> Event:
+        return evts.event_at(moscow.localize(datetime.now()))
+
+    @staticmethod
+    def _next_event(evts: Events) -> Event:
+        # this function will return the next event after the current time, no matter if now is in the event or break.
+        return evts.event_after(moscow.localize(datetime.now()))
+
+    @staticmethod
+    def _on_an_event(evts: Events) -> bool:
+        return evts.event_at(moscow.localize(datetime.now())) is not None
+
+    @staticmethod
+    def _on_break(evts: Events) -> bool:
+        # careful, it must find out if it's a real break and not night or before the first event!
+        # return false if 0 events today
+        if len(evts)==0:
+            return False  # it can't be a break if there is no event.
+        now=moscow.localize(datetime.now())
+        if evts.event_at(now) is not None:
+            return False
+        # from now on, we are on an eventless time. Either break or rest of the day.
+        return evts[0].start_datetime<=now<=evts[-1].end_datetime  # not before the first event and not after the last one
+
+    @staticmethod
+    def _on_non_working_time(evts: Events) -> bool:
+        now=moscow.localize(datetime.now())
+        # return true if length is 0
+        return len(evts)==0 or now<evts[0].start_datetime or now>evts[-1].end_datetime  # one-liner to check if it's a non-working time.
+    #endregion
+
+
+class Schedule(_ScheduleBase):
+    """The main class for abstracting the modeus api"""
+    def __init__(self, email: str, password: str, cache_folder: str=".cache", client: ModeusClient=None, shard: str="month", max_concurrency: int=4):
+        """
+        Initialize the Schedule object with email and password. It will check the token and load it if it's not expired.
+
+        Parameters:
+        email (str): Email for modeus
+        password (str): Password for modeus
+        cache_folder (str): Folder to save the cache. If not given, it will save in .cache folder.
+        client (ModeusClient): Session to talk to modeus. If not given, a new pooled session is created and owned by this object.
+        shard (str): ranges longer than a "month" or a "week" are split and fetched concurrently.
+        max_concurrency (int): how many shards are fetched at the same time.
+        """
+        super().__init__(email, password, cache_folder, shard, max_concurrency)
+        self.client=client if client is not None else ModeusClient()
+        self._refresh=SingleFlight()
+        self._refresh_thread=None
+        self._restore_token()
+        self.client.on_unauthorized=self._token_rejected
+
+        self.check_token()
+
+    def close(self):
+        """Closes the modeus session. Call it when the object is not needed anymore."""
+        self.client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def check_token(self):
+        """
+        Checks if token is expired or not loaded. If it's expired, about to expire or not loaded, get a new token. This function is automatically called by every method that talks to modeus.
+        The token fetched from modeus very slowly, in a few requests and regex parsing, so it is saved in the cache folder and reused by the next runs until its exp claim says it's dead.
+
+        Only one login runs at a time: the other threads wait for it and get its result. A failed login is shared for a while instead of being retried by every thread.
+        Within the refresh margin the old token is still used and the login runs in the background.
+
+        Raises:
+        Exception: If the token is not loaded successfully or internet connection is not available.
+        """
+        if not self.token_expired:
+            return
+        if self.token_dead:
+            self._refresh.run(self._login)
+        elif not self._refresh_thread or not self._refresh_thread.is_alive():
+            self._refresh_thread=threading.Thread(target=self._background_login, daemon=True)
+            self._refresh_thread.start()
+
+    def _login(self):
+        if not self.token_expired:  # somebody refreshed it while we were waiting for the lock
+            return
+        try:
+            self._set_token(self.client.login(self.email, self.password))
+        except Exception as e:
+            if self.token_dead:
+                self.token=None
+                self.client.token=None
+            raise e
+
+    def _token_rejected(self, rejected: str):
+        # the client calls it on 401/403 and sends the request again. Concurrent rejected calls share one login
+        self._forget_token(rejected)
+        self.check_token()
+
+    def _background_login(self):
+        try:
+            self._refresh.run(self._login)
+        except Exception as e:
+            logging.warning(f"Background token refresh failed, the old token is used until it dies: {e}")
+
+    def fetch_schedule(self, person_id: str, start_time: date=None, end_time: date=None) -> Events:
+        """
+        Gets schedule for a person.
+
+        Parameters:
+        person_id (str): ID of the person to get schedule for.
+        start_time (datetime): start time of the schedule. If not given, it will get schedule for today.
+        end_time (datetime): end time of the schedule. If not given, it will get schedule for today.
+
+        Returns:
+        Events: Schedule of the person. If some shards of a long range failed, the events of the others are returned and the failed ranges are in their failed_ranges.
+        """
+        if not person_id:
+            raise ValueError("No person_id to get schedule.")
+        self.check_token()
+        start_time, end_time = time_range(start_time, end_time)
+        shards=split_range(start_time, end_time, self.shard)
+        if len(shards)==1:
+            return Events.from_big_mess(self.client.get_schedule(person_id, start_time, end_time))
+        results={}
+        errors={}
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            futures={pool.submit(self.client.get_schedule, person_id, start, end): i for i, (start, end) in enumerate(shards)}
+            for future in as_completed(futures):  # parse every shard as soon as it comes
+                i=futures[future]
+                try:
+                    results[i]=Events.from_big_mess(future.result())
+                except Exception as e:
+                    errors[i]=e
+        return self._merge_shards(shards, results, errors)
+
+    def fetch_many(self, person_ids: list[str], start_time: date=None, end_time: date=None, batch_size: int=10) -> dict[str, Events]:
+        """
+        Gets schedules of many people, sending batch_size ids in one request. Batches are fetched concurrently.
+
+        Parameters:
+        person_ids (list): IDs of the people to get schedule for.
+        start_time (datetime): start time of the schedule. If not given, it will get schedule for today.
+        end_time (datetime): end time of the schedule. If not given, it will get schedule for today.
+        batch_size (int): how many people are asked in one request.
+
+        Returns:
+        dict: person id -> Events of the person.
+        """
+        person_ids=list(dict.fromkeys(person_ids))  # unique, but in the same order
+        if not person_ids:
+            return {}
+        self.check_token()
+        start, end = time_range(start_time, end_time)
+        batches=[person_ids[i:i+batch_size] for i in range(0, len(person_ids), batch_size)]
+        def fetch(batch):
+            return self._split_by_person(self.client.get_schedule(batch, start, end), batch)
+        with ThreadPoolExecutor(max_workers=min(len(batches), self.client.max_connections)) as pool:
+            results=list(pool.map(fetch, batches))
+        schedules={}
+        unresolved=[]
+        for found, missing in results:
+            schedules.update(found)
+            unresolved+=missing
+        for person_id in unresolved:
+            schedules[person_id]=self.fetch_schedule(person_id, start_time, end_time)
+        return {person_id: schedules[person_id] for person_id in person_ids}
+
+    def free_slots(self, person_ids: list[str], start_time: date=None, end_time: date=None, min_duration: timedelta=LESSON, grid: str="bells") -> list[FreeSlot]:
+        """
+        Finds the times when all the people are free, e.g. for a consultation of a whole group. Schedules are taken from the cache or fetched all at once.
+
+        Parameters:
+        person_ids (list): IDs of the people.
+        start_time (date): first day to look in. If not given, today.
+        end_time (date): last day to look in. If not given, the start day.
+        min_duration (timedelta): how long the free time must be.
+        grid (str): "bells" for slots starting at the bells of the pairs, "minutes" for whole free windows.
+
+        Returns:
+        list: FreeSlot sorted by start. Times on sundays and outside of the pairs hours are not offered.
+        """
+        schedules, missing=self._cached_many(person_ids, start_time, end_time)
+        schedules.update(self.fetch_many(missing, start_time, end_time))
+        return free_slots(schedules.values(), *time_range(start_time, end_time), min_duration, grid)
+
+    def overlap(self, person_ids: list[str], start_time: date=None, end_time: date=None) -> list[Overlap]:
+        """
+        Finds when all the people are busy at the same time, e.g. the common classes with a friend. Schedules are taken from the cache or fetched all at once.
+
+        Parameters:
+        person_ids (list): IDs of the people, two or more.
+        start_time (date): first day to look in. If not given, today.
+        end_time (date): last day to look in. If not given, the start day.
+
+        Returns:
+        list: Overlap sorted by start, the events in it are in the order of person_ids.
+        """
+        person_ids=list(dict.fromkeys(person_ids))
+        schedules, missing=self._cached_many(person_ids, start_time, end_time)
+        schedules.update(self.fetch_many(missing, start_time, end_time))
+        return overlaps(schedules[person_id] for person_id in person_ids)
+
+    def cache_schedule(self, person_id: str, start_time: date=None, end_time: date=None, override: bool=False) -> Events|None:
+        """
+        Caches the schedule for a person.
+
+        Parameters:
+        person_id (str): ID of the person to cache schedule for.
+        start_time (datetime): start time of the schedule. If not given, it will get schedule for today.
+        end_time (datetime): end time of the schedule. If not given, it will get schedule for today.
+        override (bool): If True, it will override the cache, else it will append to the cache.
+
+        Returns:
+        Events: The fetched schedule, or None if the person is not me. It's not cached if it has failed_ranges.
+        """
+        if person_id != self.me_id:
+            return None
+        evts=self.fetch_schedule(person_id, start_time, end_time)
+        self._write_cache(person_id, evts, override)
+        return evts
+
     def schedule(self, person_id: str, start_time: date=None, end_time: date=None) -> Events:
         """
         Gets schedule for a person. If the schedule is not cached, it will fetch the schedule and cache it.
@@ -155,17 +531,19 @@ class Schedule:
         Returns:
         list: Schedule of the person in json format.
         """
-        try:
-            evts = self.load_timed_schedule(person_id, start_time, end_time)
-            effective_end_time = end_time if end_time is not None else datetime.now().date()
-            # can we check if the cache has all the events we need?
-            if len(evts)==0 or evts[len(evts)-1].event_date < effective_end_time:
-                # fetch the schedule and cache it.
-                self.cache_schedule(person_id, start_time, end_time)
-                evts = self.load_timed_schedule(person_id, start_time, end_time)
-        except FileNotFoundError:
-            self.cache_schedule(person_id, start_time, end_time)
-            evts = self.load_timed_schedule(person_id, start_time, end_time)
+        evts = self._cached_schedule(person_id, start_time, end_time)
+        if evts is None:
+            # fetch the schedule and cache it.
+            try:
+                fetched = self.cache_schedule(person_id, start_time, end_time)
+                if fetched is not None and fetched.failed_ranges:
+                    evts = fetched  # partial and not cached, so the next call fetches it again
+                else:
+                    evts = self.load_timed_schedule(person_id, start_time, end_time)
+            except NETWORK_ERRORS as e:
+                evts = self._fallback_schedule(person_id, start_time, end_time, e)
+        elif not self.online:
+            evts.stale = self._cache_age(person_id)
         self.last_events = evts
         return evts
 
@@ -191,54 +569,20 @@ class Schedule:
         Returns:
         Event: Current event of the person.
         """
-        now=moscow.localize(datetime.now())
-        evts = self.schedule(person_id)  # automatically gets the schedule for today.
-        for evt in evts:
-            if evt.start_datetime<=now<=evt.end_datetime:
-                return evt
-
+        return self._now_event(self.schedule(person_id))  # automatically gets the schedule for today.
 
     def next(self, person_id: str) -> Event:
-        # this function will return the next event after the current time, no matter if now is in the event or break.
-        now=moscow.localize(datetime.now())
-        evts = self.schedule(person_id)
-        for evt in evts:
-            if evt.start_datetime>now:
-                return evt
+        return self._next_event(self.schedule(person_id))
 
     def on_an_event(self, person_id: str) -> bool:
-        # get today's schedule
-        evts = self.schedule(person_id)
-        now=moscow.localize(datetime.now())
-        for evt in evts:
-            if evt.start_time<=now<=evt.end_time:
-                return True
-        return False
+        return self._on_an_event(self.schedule(person_id))
 
     def on_break(self, person_id: str) -> bool:
-        # careful, it must find out if it's a real break and not night or before the first event!
-        # return false if 0 events today
-        evts = self.schedule(person_id)
-        if len(evts)==0:
-            return False  # it can't be a break if there is no event.
-        now=moscow.localize(datetime.now())
-        for i, evt in enumerate(evts):
-            if evt.start_datetime<=now<=evt.end_datetime:
-                return False
-            # from now on, we are on an eventless time. Either break or rest of the day.
-            if i==0 and now<evt.start_datetime:  # before the first event
-                return False
-            if i==len(evts)-1 and now>evt.end_datetime:  # after the last event
-                return False
-        return True  # yess, loop is over and none of the conditions are met.
+        return self._on_break(self.schedule(person_id))
 
     def on_non_working_time(self, person_id: str) -> bool:
         #return not self.on_an_event and not self.on_break  # is it efficient? Probably not.
-        # get today's schedule
-        evts = self.schedule(person_id)
-        now=moscow.localize(datetime.now())
-        # return true if length is 0
-        return len(evts)==0 or now<evts[0].start_datetime or now>evts[-1].end_datetime  # one-liner to check if it's a non-working time.
+        return self._on_non_working_time(self.schedule(person_id))
 
     def search_person(self, term: str, by_id: bool = False) -> People:
         """
@@ -249,13 +593,17 @@ class Schedule:
         by_id (bool): If True, search by id, else search by name.
 
         Returns:
-        People: List of people that match the term.
+        People: List of people that match the term. If modeus is unreachable, they are searched among the people found before, and their stale attribute says how old that cache is.
         """
-        self.check_token()
-        results=People.from_big_mess(search_person(term, by_id, self.token)["_embedded"])
-        # if we searched with russian letter yo, and no results, then search with e instead.
-        if len(results)==0 and "ё" in term:
-            results=People.from_big_mess(search_person(term.replace("ё", "е"), by_id, self.token)["_embedded"])
+        try:
+            self.check_token()
+            results=People.from_big_mess(self.client.search_person(term, by_id)["_embedded"])
+            # if we searched with russian letter yo, and no results, then search with e instead.
+            if len(results)==0 and "ё" in term:
+                results=People.from_big_mess(self.client.search_person(term.replace("ё", "е"), by_id)["_embedded"])
+        except NETWORK_ERRORS as e:
+            return self._offline_people(term, by_id, e)
+        self._remember_people(results)
         return results
 
     def who_goes(self, event: Event) -> People:
@@ -269,11 +617,290 @@ class Schedule:
         People: List of people who goes to the event.
         """
         self.check_token()
-        ppl=People.from_who_goes(who_goes(event.event_id, self.token))  # this data doesn't have "_embedded" key
+        ppl=People.from_who_goes(self.client.who_goes(event.event_id))  # this data doesn't have "_embedded" key
         # we need to get the full data of every teacher, because who_goes doesn't return full data.
         for person in ppl:
             if person.type==Employee:
-                person=person.mutate(People.from_big_mess(search_person(person.name, False, self.token)["_embedded"])[0])  # don't search by id, the api returns 500 error if we do that.
+                person=person.mutate(People.from_big_mess(self.client.search_person(person.name, False)["_embedded"])[0])  # don't search by id, the api returns 500 error if we do that.
+        return ppl
+
+
+class AsyncSchedule(_ScheduleBase):
+    """
+    Asyncio counterpart of Schedule. Every method that talks to modeus is a coroutine, and all of them share one AsyncModeusClient.
+    The token is not fetched in the constructor, it is fetched lazily by the first call that needs it.
+    """
+    def __init__(self, email: str, password: str, cache_folder: str=".cache", client: AsyncModeusClient=None, shard: str="month", max_concurrency: int=4):
+        """
+        Parameters:
+        email (str): Email for modeus
+        password (str): Password for modeus
+        cache_folder (str): Folder to save the cache. If not given, it will save in .cache folder.
+        client (AsyncModeusClient): Session to talk to modeus. If not given, a new pooled session is created and owned by this object.
+        shard (str): ranges longer than a "month" or a "week" are split and fetched concurrently.
+        max_concurrency (int): how many shards are fetched at the same time.
+        """
+        super().__init__(email, password, cache_folder, shard, max_concurrency)
+        self.client=client if client is not None else AsyncModeusClient()
+        self._refresh=AsyncSingleFlight()
+        self._background_tasks=set()
+        self._restore_token()
+        self.client.on_unauthorized=self._token_rejected
+
+    async def aclose(self):
+        """Closes the modeus session."""
+        await self.client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def check_token(self):
+        """
+        Checks if token is expired or not loaded. If it's expired or not loaded, get a new token.
+        Only one login runs at a time, the other tasks await it. A failed login is shared for a while. Within the refresh margin the old token is used and the login runs in the background.
+
+        Raises:
+        Exception: If the token is not loaded successfully or internet connection is not available.
+        """
+        if not self.token_expired:
+            return
+        if self.token_dead:
+            await self._refresh.run(self._login)
+        elif not self._refresh.running:
+            task=asyncio.ensure_future(self._background_login())
+            self._background_tasks.add(task)  # keep a reference, or the task can be garbage collected
+            task.add_done_callback(self._background_tasks.discard)
+
+    async def _login(self):
+        if not self.token_expired:
+            return
+        try:
+            self._set_token(await self.client.login(self.email, self.password))
+        except Exception as e:
+            if self.token_dead:
+                self.token=None
+                self.client.token=None
+            raise e
+
+    async def _token_rejected(self, rejected: str):
+        self._forget_token(rejected)
+        await self.check_token()
+
+    async def _background_login(self):
+        try:
+            await self._refresh.run(self._login)
+        except Exception as e:
+            logging.warning(f"Background token refresh failed, the old token is used until it dies: {e}")
+
+    async def fetch_schedule(self, person_id: str, start_time: date=None, end_time: date=None) -> Events:
+        """
+        Gets schedule for a person.
+
+        Parameters:
+        person_id (str): ID of the person to get schedule for.
+        start_time (datetime): start time of the schedule. If not given, it will get schedule for today.
+        end_time (datetime): end time of the schedule. If not given, it will get schedule for today.
+
+        Returns:
+        Events: Schedule of the person. If some shards of a long range failed, the events of the others are returned and the failed ranges are in their failed_ranges.
+        """
+        if not person_id:
+            raise ValueError("No person_id to get schedule.")
+        await self.check_token()
+        start_time, end_time = time_range(start_time, end_time)
+        shards=split_range(start_time, end_time, self.shard)
+        if len(shards)==1:
+            return Events.from_big_mess(await self.client.get_schedule(person_id, start_time, end_time))
+        semaphore=asyncio.Semaphore(self.max_concurrency)
+        async def fetch(i, start, end):
+            async with semaphore:
+                try:
+                    return i, Events.from_big_mess(await self.client.get_schedule(person_id, start, end)), None
+                except Exception as e:
+                    return i, None, e
+        results={}
+        errors={}
+        for shard in asyncio.as_completed([fetch(i, start, end) for i, (start, end) in enumerate(shards)]):
+            i, events, error=await shard
+            if error is None:
+                results[i]=events
+            else:
+                errors[i]=error
+        return self._merge_shards(shards, results, errors)
+
+    async def fetch_many(self, person_ids: list[str], start_time: date=None, end_time: date=None, batch_size: int=10) -> dict[str, Events]:
+        """
+        Gets schedules of many people, sending batch_size ids in one request. Batches are fetched concurrently.
+
+        Parameters:
+        person_ids (list): IDs of the people to get schedule for.
+        start_time (datetime): start time of the schedule. If not given, it will get schedule for today.
+        end_time (datetime): end time of the schedule. If not given, it will get schedule for today.
+        batch_size (int): how many people are asked in one request.
+
+        Returns:
+        dict: person id -> Events of the person.
+        """
+        person_ids=list(dict.fromkeys(person_ids))
+        if not person_ids:
+            return {}
+        await self.check_token()
+        start, end = time_range(start_time, end_time)
+        batches=[person_ids[i:i+batch_size] for i in range(0, len(person_ids), batch_size)]
+        datas=await asyncio.gather(*(self.client.get_schedule(batch, start, end) for batch in batches))
+        schedules={}
+        unresolved=[]
+        for data, batch in zip(datas, batches):
+            found, missing=self._split_by_person(data, batch)
+            schedules.update(found)
+            unresolved+=missing
+        alone=await asyncio.gather(*(self.fetch_schedule(person_id, start_time, end_time) for person_id in unresolved))
+        schedules.update(zip(unresolved, alone))
+        return {person_id: schedules[person_id] for person_id in person_ids}
+
+    async def free_slots(self, person_ids: list[str], start_time: date=None, end_time: date=None, min_duration: timedelta=LESSON, grid: str="bells") -> list[FreeSlot]:
+        """
+        Finds the times when all the people are free, e.g. for a consultation of a whole group. Schedules are taken from the cache or fetched all at once.
+
+        Parameters:
+        person_ids (list): IDs of the people.
+        start_time (date): first day to look in. If not given, today.
+        end_time (date): last day to look in. If not given, the start day.
+        min_duration (timedelta): how long the free time must be.
+        grid (str): "bells" for slots starting at the bells of the pairs, "minutes" for whole free windows.
+
+        Returns:
+        list: FreeSlot sorted by start. Times on sundays and outside of the pairs hours are not offered.
+        """
+        schedules, missing=self._cached_many(person_ids, start_time, end_time)
+        schedules.update(await self.fetch_many(missing, start_time, end_time))
+        return free_slots(schedules.values(), *time_range(start_time, end_time), min_duration, grid)
+
+    async def overlap(self, person_ids: list[str], start_time: date=None, end_time: date=None) -> list[Overlap]:
+        """
+        Finds when all the people are busy at the same time, e.g. the common classes with a friend. Schedules are taken from the cache or fetched all at once.
+
+        Parameters:
+        person_ids (list): IDs of the people, two or more.
+        start_time (date): first day to look in. If not given, today.
+        end_time (date): last day to look in. If not given, the start day.
+
+        Returns:
+        list: Overlap sorted by start, the events in it are in the order of person_ids.
+        """
+        person_ids=list(dict.fromkeys(person_ids))
+        schedules, missing=self._cached_many(person_ids, start_time, end_time)
+        schedules.update(await self.fetch_many(missing, start_time, end_time))
+        return overlaps(schedules[person_id] for person_id in person_ids)
+
+    async def cache_schedule(self, person_id: str, start_time: date=None, end_time: date=None, override: bool=False) -> Events|None:
+        """
+        Caches the schedule for a person.
+
+        Parameters:
+        person_id (str): ID of the person to cache schedule for.
+        start_time (datetime): start time of the schedule. If not given, it will get schedule for today.
+        end_time (datetime): end time of the schedule. If not given, it will get schedule for today.
+        override (bool): If True, it will override the cache, else it will append to the cache.
+
+        Returns:
+        Events: The fetched schedule, or None if the person is not me. It's not cached if it has failed_ranges.
+        """
+        if person_id != self.me_id:
+            return None
+        evts=await self.fetch_schedule(person_id, start_time, end_time)
+        self._write_cache(person_id, evts, override)
+        return evts
+
+    async def schedule(self, person_id: str, start_time: date=None, end_time: date=None) -> Events:
+        """
+        Gets schedule for a person. If the schedule is not cached, it will fetch the schedule and cache it.
+
+        Parameters:
+        person_id (str): ID of the person to get schedule for.
+        start_time (datetime): start time of the schedule. If not given, it will get schedule for today.
+        end_time (datetime): end time of the schedule. If not given, it will get schedule for today.
+
+        Returns:
+        Events: Schedule of the person.
+        """
+        evts = self._cached_schedule(person_id, start_time, end_time)
+        if evts is None:
+            try:
+                fetched = await self.cache_schedule(person_id, start_time, end_time)
+                if fetched is not None and fetched.failed_ranges:
+                    evts = fetched  # partial and not cached, so the next call fetches it again
+                else:
+                    evts = self.load_timed_schedule(person_id, start_time, end_time)
+            except NETWORK_ERRORS as e:
+                evts = self._fallback_schedule(person_id, start_time, end_time, e)
+        elif not self.online:
+            evts.stale = self._cache_age(person_id)
+        self.last_events = evts
+        return evts
+
+    async def __call__(self, person_id: str, start_time: date=None, end_time: date=None) -> Events:
+        """Alias for schedule function."""
+        return await self.schedule(person_id, start_time, end_time)
+
+    async def now(self, person_id: str) -> Event:
+        """Gets the current event for a person."""
+        return self._now_event(await self.schedule(person_id))
+
+    async def next(self, person_id: str) -> Event:
+        return self._next_event(await self.schedule(person_id))
+
+    async def on_an_event(self, person_id: str) -> bool:
+        return self._on_an_event(await self.schedule(person_id))
+
+    async def on_break(self, person_id: str) -> bool:
+        return self._on_break(await self.schedule(person_id))
+
+    async def on_non_working_time(self, person_id: str) -> bool:
+        return self._on_non_working_time(await self.schedule(person_id))
+
+    async def search_person(self, term: str, by_id: bool = False) -> People:
+        """
+        Searches person in modeus. If not found, returns empty list.
+
+        Parameters:
+        term (str): The term to search (Full name or id).
+        by_id (bool): If True, search by id, else search by name.
+
+        Returns:
+        People: List of people that match the term. If modeus is unreachable, they are searched among the people found before, and their stale attribute says how old that cache is.
+        """
+        try:
+            await self.check_token()
+            results=People.from_big_mess((await self.client.search_person(term, by_id))["_embedded"])
+            if len(results)==0 and "ё" in term:
+                results=People.from_big_mess((await self.client.search_person(term.replace("ё", "е"), by_id))["_embedded"])
+        except NETWORK_ERRORS as e:
+            return await asyncio.to_thread(self._offline_people, term, by_id, e)
+        if not self._knows(results):
+            await asyncio.to_thread(self._remember_people, results)  # file io doesn't belong on the event loop
+        return results
+
+    async def who_goes(self, event: Event) -> People:
+        """
+        Gets who goes to an event. A list of people bound to the event.
+
+        Parameters:
+        event (Event): The event to get who goes.
+
+        Returns:
+        People: List of people who goes to the event.
+        """
+        await self.check_token()
+        ppl=People.from_who_goes(await self.client.who_goes(event.event_id))
+        # full data of the teachers is searched all at once, not one by one.
+        teachers=[person for person in ppl if person.type==Employee]
+        found=await asyncio.gather(*(self.client.search_person(person.name, False) for person in teachers))
+        for person, data in zip(teachers, found):
+            person.mutate(People.from_big_mess(data["_embedded"])[0])
         return ppl
 
 
@@ -287,5 +914,3 @@ def auth(email, password):
         return (modeus_auth(email, password), "")  # empty string means no error and either success or unsuccess confirmed by server.
     except Exception as e:
         return (True, str(e))  # if not empty, then it's an error message.
-
-
@@ -0,0 +1,161 @@
+# Keeps the modeus token between runs, so we don't log in through all the redirects on every start.
+
+import os
+import json
+import time
+import base64
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+from pathlib import Path
+from datetime import datetime
+
+
+def jwt_expiry(token: str) -> datetime|None:
+    """
+    Reads the expiry time from the exp claim of a JWT. The signature is not checked, we only need to know when to refresh.
+
+    Parameters:
+    token (str): the id_token.
+
+    Returns:
+    datetime|None: local naive expiry time, or None if the token is not a JWT or has no exp.
+    """
+    try:
+        payload=token.split(".")[1]
+        payload+="="*(-len(payload)%4)  # base64url without padding
+        claims=json.loads(base64.urlsafe_b64decode(payload))
+        return datetime.fromtimestamp(int(claims["exp"]))
+    except (IndexError, ValueError, KeyError, TypeError, AttributeError):
+        return None
+
+
+class TokenStore:
+    """
+    Stores the token of one account in a json file that only the owner can read.
+    """
+    def __init__(self, path: str|Path):
+        """
+        Parameters:
+        path (str): the file to keep the token in.
+        """
+        self.path=Path(path)
+
+    def load(self, email: str) -> tuple[str, datetime]|None:
+        """
+        Loads the token saved for the email.
+
+        Returns:
+        tuple|None: (token, expiry time) or None if there is no token for this email or it is already expired.
+        """
+        try:
+            with self.path.open("r", encoding="utf-8") as f:
+                data=json.load(f)
+            if data["email"]!=email:
+                return None
+            expire=datetime.fromisoformat(data["expire"])
+        except FileNotFoundError:
+            return None
+        except (ValueError, KeyError, TypeError) as e:
+            logging.warning(f"Token store {self.path} is corrupted, ignoring it: {e}")
+            return None
+        if expire<=datetime.now():
+            return None
+        return data["token"], expire
+
+    def save(self, email: str, token: str, expire: datetime):
+        """Saves the token. The file is created with 0600 permissions and replaced atomically."""
+        tmp=self.path.with_name(self.path.name+".tmp")
+        fd=os.open(tmp, os.O_WRONLY|os.O_CREAT|os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"email": email, "token": token, "expire": expire.isoformat()}, f)
+        os.replace(tmp, self.path)
+
+    def clear(self):
+        """Removes the saved token."""
+        self.path.unlink(missing_ok=True)
+
+
+class SingleFlight:
+    """
+    Lets only one thread run the call at a time. Everybody who comes while it runs waits for the same result instead of starting their own call.
+    A failure is remembered for negative_ttl seconds and raised to the next callers right away, without calling again.
+    Only Exception is a failure: KeyboardInterrupt, SystemExit and cancellation are raised, but not remembered.
+    """
+    def __init__(self, negative_ttl: float=30):
+        """
+        Parameters:
+        negative_ttl (float): how long a failure is shared, in seconds.
+        """
+        self.negative_ttl=negative_ttl
+        self._lock=threading.Lock()
+        self._running=None  # Future of the call in flight
+        self._failure=None  # (exception, monotonic time until it's shared)
+
+    def run(self, func):
+        """Runs func() or joins the call that is already running. Returns its result or raises its exception."""
+        with self._lock:
+            if self._failure is not None:
+                error, until=self._failure
+                if time.monotonic()<until:
+                    raise error
+                self._failure=None
+            future=self._running
+            leader=future is None
+            if leader:
+                future=self._running=Future()
+        if leader:
+            try:
+                future.set_result(func())
+            except Exception as e:
+                with self._lock:
+                    self._failure=(e, time.monotonic()+self.negative_ttl)
+                future.set_exception(e)
+            except BaseException as e:
+                # KeyboardInterrupt, SystemExit: the waiters fail with it too, but it's not remembered, the next call tries again
+                future.set_exception(e)
+                raise
+            finally:
+                with self._lock:
+                    self._running=None
+        return future.result()
+
+
+class AsyncSingleFlight:
+    """
+    Asyncio version of SingleFlight. The call runs in its own task, so a cancelled waiter doesn't cancel it for the others.
+    """
+    def __init__(self, negative_ttl: float=30):
+        """
+        Parameters:
+        negative_ttl (float): how long a failure is shared, in seconds.
+        """
+        self.negative_ttl=negative_ttl
+        self._task=None
+        self._failure=None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def _lead(self, func):
+        try:
+            return await func()
+        except Exception as e:  # a cancellation is not a failure of the login, it's not shared with the next callers
+            self._failure=(e, time.monotonic()+self.negative_ttl)
+            raise
+        finally:
+            self._task=None
+
+    async def run(self, func):
+        """Awaits func() or joins the call that is already running. Returns its result or raises its exception."""
+        if self._failure is not None:
+            error, until=self._failure
+            if time.monotonic()<until:
+                raise error
+            self._failure=None
+        if self._task is None:
+            self._task=asyncio.ensure_future(self._lead(func))
+            self._task.add_done_callback(lambda task: task.cancelled() or task.exception())  # the result is given to the waiters, don't warn about it
+        return await asyncio.shield(self._task)